@@ -9,7 +9,7 @@ from plots import (
     export_fig,
 )
 from utils import (
-    get_list_survey,
+    get_survey_table,
     get_grades,
     get_candidates,
 )
@@ -31,17 +31,16 @@ def batch_merit_profile(df, args, auto_text: bool = False):
     auto_text : bool
         If True, the intention of grade is automatically generated on the merit profile plot
     """
-    surveys = get_list_survey(df)
+    df_surveys = get_survey_table(df)
 
-    for survey in surveys:
-        df_survey = df[df["id"] == survey].copy()
+    for survey, df_survey in df.groupby("id", sort=False, observed=True):
+        df_survey = df_survey.copy()
 
-        first_idx = df_survey.first_valid_index()
-        source = df_survey["nom_institut"].loc[first_idx]
-        sponsor = df_survey["commanditaire"].loc[first_idx]
-        date = df_survey["fin_enquete"].loc[first_idx]
-        nb_grades = df_survey["nombre_mentions"].unique()[0]
-        grades = get_grades(df_survey, nb_grades)
+        source = df_surveys.at[survey, "nom_institut"]
+        sponsor = df_surveys.at[survey, "commanditaire"]
+        date = df_surveys.at[survey, "fin_enquete"]
+        nb_grades = df_surveys.at[survey, "nombre_mentions"]
+        grades = get_grades(df_survey, nb_grades, df_surveys)
 
         if args.merit_profiles:
             fig = plot_merit_profiles(
@@ -59,6 +58,7 @@ def batch_merit_profile(df, args, auto_text: bool = False):
 
 
 def batch_ranking(df, args, on_rolling_data: bool = False):
+    df_surveys = get_survey_table(df)
     for poll in PollingOrganizations:
         df_poll = df[df["nom_institut"] == poll.value].copy() if poll != PollingOrganizations.ALL else df.copy()
         # continue only if the dataframe is not empty
@@ -78,6 +78,7 @@ def batch_ranking(df, args, on_rolling_data: bool = False):
                 breaks_in_names=True,
                 show_best_grade=False,
                 on_rolling_data=on_rolling_data,
+                df_surveys=df_surveys,
             )
             filename = f"ranking_plot_{label}"
             print(filename)
@@ -101,6 +102,7 @@ def batch_time_merit_profile(df, args, aggregation, polls: PollingOrganizations
     # check if polls is iterable
     if not isinstance(polls, Iterable):
         polls = [polls]
+    df_surveys = get_survey_table(df)
     for poll in polls:
         if poll == PollingOrganizations.ALL and aggregation == AggregationMode.NO_AGGREGATION:
             continue
@@ -116,7 +118,7 @@ def batch_time_merit_profile(df, args, aggregation, polls: PollingOrganizations
             if temp_df.empty:
                 continue
             if args.time_merit_profile:
-                fig = plot_time_merit_profile(temp_df, source=source, sponsor=sponsor)
+                fig = plot_time_merit_profile(temp_df, source=source, sponsor=sponsor, df_surveys=df_surveys)
                 filename = f"time_merit_profile{aggregation_label}_{c}_{label}"
                 print(filename)
                 export_fig(fig, args, filename)
@@ -124,7 +126,7 @@ def batch_time_merit_profile(df, args, aggregation, polls: PollingOrganizations
     for c in get_candidates(df):
         temp_df = df[df["candidat"] == c]
         if args.time_merit_profile:
-            fig = plot_time_merit_profile_all_polls(temp_df, aggregation)
+            fig = plot_time_merit_profile_all_polls(temp_df, aggregation, df_surveys=df_surveys)
             filename = f"time_merit_profile_comparison{aggregation_label}_{c}"
             print(filename)
             export_fig(fig, args, filename)
@@ -134,6 +136,7 @@ def batch_ranked_time_merit_profile(df, args, aggregation, polls: PollingOrganiz
     # check if polls is iterable
     if not isinstance(polls, Iterable):
         polls = [polls]
+    df_surveys = get_survey_table(df)
     for poll in polls:
         if poll == PollingOrganizations.ALL and aggregation == AggregationMode.NO_AGGREGATION:
             continue
@@ -148,7 +151,14 @@ def batch_ranked_time_merit_profile(df, args, aggregation, polls: PollingOrganiz
         if df_poll.empty:
             continue
         if args.ranked_time_merit_profile:
-            fig = plot_ranked_time_merit_profile(df_poll, source=source, sponsor=sponsor, show_no_opinion=True, on_rolling_data=on_rolling_data)
+            fig = plot_ranked_time_merit_profile(
+                df_poll,
+                source=source,
+                sponsor=sponsor,
+                show_no_opinion=True,
+                on_rolling_data=on_rolling_data,
+                df_surveys=df_surveys,
+            )
             filename = f"ranked_time_merit_profile{aggregation_label}_{label}{roll}"
             print(filename)
             export_fig(fig, args, filename)
@@ -162,6 +172,7 @@ def batch_comparison_intention(
     polls: PollingOrganizations = PollingOrganizations,
     on_rolling_data: bool = False,
 ):
+    df_surveys = get_survey_table(df)
     for poll in polls:
         if poll == PollingOrganizations.ALL and aggregation == AggregationMode.NO_AGGREGATION:
             continue
@@ -183,6 +194,7 @@ def batch_comparison_intention(
                     source=source,
                     sponsor=sponsor,
                     on_rolling_data=on_rolling_data,
+                    df_surveys=df_surveys,
                 )
                 filename = f"intention_{label}{aggregation_label}_{c}"
                 print(filename)
@@ -202,12 +214,15 @@ def batch_time_merit_profile_all(df, args, aggregation, on_rolling_data: bool =
     aggregation_label = f"_{aggregation.name}"
     roll = "_roll" if on_rolling_data else ""
 
+    df_surveys = get_survey_table(df)
     for c in get_candidates(df):
         temp_df = df_poll[df_poll["candidat"] == c]
         if temp_df.empty:
             continue
         if args.time_merit_profile:
-            fig = plot_time_merit_profile(temp_df, source=source, sponsor=sponsor, on_rolling_data=on_rolling_data)
+            fig = plot_time_merit_profile(
+                temp_df, source=source, sponsor=sponsor, on_rolling_data=on_rolling_data, df_surveys=df_surveys
+            )
             filename = f"time_merit_profile{aggregation_label}_{c}_{label}{roll}"
             print(filename)
             export_fig(fig, args, filename)
@@ -0,0 +1,167 @@
+"""
+Incremental majority judgment: the ranks of the surveys already computed are stored with a fingerprint of their content,
+and only the new or changed surveys are ranked again when the database of polls is updated.
+"""
+from pathlib import Path
+import hashlib
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .interface_mj import apply_mj
+from .libs.mj_cache import MajorityJudgmentCache
+
+
+def survey_fingerprints(df: DataFrame, cols: list, options: str = "") -> pd.Series:
+    """
+    Fingerprint of the content of each survey
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey
+    cols: list
+        cols of the content ranked, ex: the intentions (or the rolling intentions) and the sample size
+    options: str
+        options of the majority judgment, changing them changes all the fingerprints
+    Returns
+    -------
+    The Series of fingerprints indexed by survey id
+    """
+    cols = ["id", "candidat", "nombre_mentions"] + [f"mention_{i}" for i in range(1, 8)] + cols
+    row_hashes = pd.util.hash_pandas_object(df[cols], index=False)
+    return row_hashes.groupby(df["id"].to_numpy(), sort=False).agg(
+        lambda h: hashlib.sha1(h.to_numpy().tobytes() + options.encode()).hexdigest()
+    )
+
+
+def surveys_within_window(dates: pd.Series, changed_dates: pd.Series, window: str = "14d") -> np.ndarray:
+    """
+    Find the surveys whose centered rolling window touches one of the changed dates
+
+    Parameters
+    ----------
+    dates: pd.Series
+        end date of each survey (fin_enquete)
+    changed_dates: pd.Series
+        end dates of the new, changed or removed surveys
+    window: str
+        length of the centered rolling window
+    Returns
+    -------
+    The boolean mask of the surveys to rank again
+    """
+    dates = pd.to_datetime(dates).to_numpy()
+    changed_dates = np.sort(pd.to_datetime(changed_dates).to_numpy())
+    if len(changed_dates) == 0:
+        return np.zeros(len(dates), dtype=bool)
+    half_window = pd.Timedelta(window).to_timedelta64() / 2
+    # the closest changed date on each side
+    idx = np.searchsorted(changed_dates, dates)
+    after = changed_dates[np.minimum(idx, len(changed_dates) - 1)]
+    before = changed_dates[np.maximum(idx - 1, 0)]
+    return (np.abs(after - dates) <= half_window) | (np.abs(dates - before) <= half_window)
+
+
+def apply_mj_incremental(
+    df: DataFrame,
+    store: Path,
+    rolling_mj: bool = False,
+    official_lib: bool = False,
+    reversed: bool = True,
+    exact: bool = False,
+    window: str = "14d",
+    cache: MajorityJudgmentCache = None,
+):
+    """
+    Apply majority judgment only on the surveys which are not already in the store with the same content
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey
+    store: Path
+        folder where the ranks and fingerprints of the surveys are stored
+    rolling_mj: bool
+        if we apply rolling majority judgment, the surveys whose rolling window touches a new or changed survey
+        are ranked again
+    official_lib: bool
+        if we use the official majority judgment lib from MieuxVoter
+    reversed: bool
+        if the intentions are given from the best grade to the worst grade
+    exact: bool
+        if the percentages are converted into integer tallies to rank with exact arithmetic
+    window: str
+        length of the centered rolling window used to compute the rolling intentions
+    cache: MajorityJudgmentCache
+        memoization of the results of the surveys already ranked
+    Returns
+    -------
+    Return the DataFrame df with the rank within majority judgment rules for all studies,
+    and the number of surveys which have been ranked again
+    """
+    col_rank = "rang_glissant" if rolling_mj else "rang"
+    col_median_grade = "mention_majoritaire_glissante" if rolling_mj else "mention_majoritaire"
+    col_score = "score_glissant" if rolling_mj else "score"
+    # the intentions actually ranked, the rolling intentions also change with the kernel, the weights
+    # and the window of load_surveys.rolling_surveys
+    suffix = "_roll" if rolling_mj else ""
+    cols = [f"intention_mention_{i}{suffix}" for i in range(1, 8)]
+    if exact or official_lib:
+        # the percentages are converted into votes with the sample size
+        cols.append("echantillon")
+    options = f"{official_lib}-{reversed}-{exact}-{window}"
+
+    store = Path(store)
+    store_file = store / f"{col_rank}.csv"
+    fingerprints = survey_fingerprints(df, cols, options)
+    survey_dates = df.groupby("id", sort=False, observed=True)["fin_enquete"].first()
+
+    if store_file.exists():
+        df_store = pd.read_csv(store_file, na_filter=False)
+        stored_fingerprints = df_store.groupby("id", sort=False)["fingerprint"].first()
+    else:
+        df_store = pd.DataFrame(
+            columns=["id", "candidat", "fin_enquete", "fingerprint", col_rank, col_median_grade, col_score]
+        )
+        stored_fingerprints = pd.Series(dtype=object)
+
+    changed = fingerprints.reindex(survey_dates.index) != stored_fingerprints.reindex(survey_dates.index)
+    if rolling_mj:
+        removed = stored_fingerprints.index.difference(fingerprints.index)
+        stored_dates = df_store.groupby("id", sort=False)["fin_enquete"].first()
+        changed_dates = pd.concat(
+            [survey_dates[changed], stored_dates[changed[changed].index.intersection(stored_dates.index)]]
+            + [stored_dates[removed]]
+        )
+        changed |= surveys_within_window(survey_dates, changed_dates, window)
+
+    rows_to_rank = df["id"].isin(changed[changed].index)
+    keys = pd.MultiIndex.from_frame(df[["id", "candidat"]])
+    df_previous = df_store.set_index(["id", "candidat"]).reindex(keys)
+    df[col_rank] = df_previous[col_rank].to_numpy()
+    df[col_median_grade] = df_previous[col_median_grade].to_numpy()
+    df[col_score] = df_previous[col_score].to_numpy()
+
+    if rows_to_rank.any():
+        df_ranked = apply_mj(
+            df[rows_to_rank].copy(),
+            rolling_mj=rolling_mj,
+            official_lib=official_lib,
+            reversed=reversed,
+            exact=exact,
+            cache=cache,
+        )
+        df.loc[rows_to_rank, col_rank] = df_ranked[col_rank]
+        df.loc[rows_to_rank, col_median_grade] = df_ranked[col_median_grade]
+        df.loc[rows_to_rank, col_score] = df_ranked[col_score]
+    df[col_rank] = df[col_rank].astype(int)
+
+    # store the ranks of all the current surveys
+    store.mkdir(exist_ok=True, parents=True)
+    df_store = df[["id", "candidat", "fin_enquete", col_rank, col_median_grade, col_score]].copy()
+    df_store.insert(3, "fingerprint", df["id"].map(fingerprints))
+    df_store.to_csv(store_file, index=False)
+
+    return df, int(changed.sum())
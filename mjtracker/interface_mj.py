@@ -1,39 +1,31 @@
 from typing import List
+from functools import partial
 from operator import itemgetter
+from multiprocessing import Pool
 
 import numpy as np
+import pandas as pd
 from pandas import DataFrame
-from mjtracker.utils import get_grades, get_list_survey
-from .libs.majority_judgment_2 import majority_judgment as mj
+from .libs import majority_judgment_batch as batch_mj
+from .libs.merit_profiles import MeritProfiles
+from .libs.mj_cache import MajorityJudgmentCache
+from .libs.backends import get_backend, TIE_BREAKING_BACKENDS, SAMPLE_SIZE_BACKENDS
 # from .libs.majority_judgment import majority_judgment as mj
 
 
-def interface_to_official_lib(merit_profiles_dict: dict, reverse: bool):
-    """ source: https://github.com/MieuxVoter/majority-judgment-library-python/tree/main """
-    from majority_judgment import majority_judgment as mj
-    from majority_judgment import compute_majority_values
-    from majority_judgment import median_grade
-    official_merit_profiles_dict = dict()
-    for k, v in merit_profiles_dict.items():
-        official_merit_profiles_dict[k] = [[i] * x for i, x in enumerate(v)]
-        official_merit_profiles_dict[k] = [item for sublist in official_merit_profiles_dict[k] for item in sublist]
-
-    set_num_votes = {len(votes) for votes in official_merit_profiles_dict.values()}
-    if not len(set_num_votes) == 1:
-        raise NotImplementedError("Unbalanced grades have not been implemented yet.")
-
-    best_grades = {}
-    for candidate, votes in merit_profiles_dict.items():
-        best_grades[candidate] = median_grade(np.cumsum(votes)/np.sum(votes))
-
-    return mj(official_merit_profiles_dict, reverse=reverse), best_grades
-
-
 def apply_mj(
     df: DataFrame,
     rolling_mj: bool = False,
     official_lib: bool = False,
     reversed: bool = True,
+    exact: bool = False,
+    nb_workers: int = None,
+    parallel_threshold: int = 500,
+    cache: MajorityJudgmentCache = None,
+    backend: str = None,
+    margins: bool = False,
+    method: str = "majority",
+    max_votes: int = None,
 ):
     """
     Reindexing candidates in the dataFrame following majority judgment rules
@@ -46,131 +38,283 @@ def apply_mj(
         if we apply rolling majority judgment
     official_lib: bool
         if we use the official majority judgment lib from MieuxVoter
+    reversed: bool
+        if the intentions are given from the best grade to the worst grade
+    exact: bool
+        if the percentages are converted into integer tallies with the sample size (echantillon)
+        to rank with exact arithmetic
+    nb_workers: int
+        number of worker processes ranking batches of surveys, serial if None
+    parallel_threshold: int
+        minimum number of surveys to use the worker processes, below it is faster to stay serial
+    cache: MajorityJudgmentCache
+        memoization of the results of the surveys already ranked, not shared with worker processes
+    backend: str
+        name of the majority judgment backend (batch, batch_exact, fabre, gauge, value, official),
+        chosen from official_lib and exact if None
+    margins: bool
+        if the votes needed to swap each pair of candidates are stored in the col marge_rang (or marge_rang_glissant),
+        see apply_backend_mj
+    method: str
+        tie-breaking rule of the highest median: majority (judgment), typical, central or usual (judgment),
+        see majority_judgment_batch.tie_breaking_scores
+    max_votes: int
+        maximum number of votes of a survey expanded to call the official lib, the largest sample size (echantillon)
+        of df if None so that every survey is ranked by the official lib itself, see apply_backend_mj
     Returns
     -------
-    Return the DataFrame df with the rank within majority judgment rules for all studies
+    Return the DataFrame df with the rank within majority judgment rules for all studies,
+    and the score of 'La recherche' (score or score_glissant) to plot a continuous ranking
     """
-    surveys = get_list_survey(df)
+    if nb_workers is not None and nb_workers > 1 and df["id"].nunique() >= parallel_threshold:
+        return apply_mj_parallel(
+            df,
+            nb_workers,
+            rolling_mj,
+            official_lib,
+            reversed,
+            exact,
+            backend=backend,
+            margins=margins,
+            method=method,
+            max_votes=max_votes,
+        )
+
     # Compute the rank for each survey
     col_rank = "rang_glissant" if rolling_mj else "rang"
     col_median_grade = "mention_majoritaire_glissante" if rolling_mj else "mention_majoritaire"
+    col_score = "score_glissant" if rolling_mj else "score"
     df[col_rank] = None
     df[col_median_grade] = None
 
     suffix = "_roll" if rolling_mj else ""
     col_intentions = [f"intention_mention_{i}{suffix}" for i in range(1, 8)]
 
-    for survey in surveys:
-        print(survey)
-        # only the chosen survey
-        df_survey = df[df["id"] == survey].copy()
-        nb_grades = int(df_survey["nombre_mentions"].unique()[0])
-        cur_col_intentions = col_intentions[:nb_grades]
-        df_with_rank = sort_candidates_mj(
-            df_survey,
-            nb_grades,
-            col_rank,
-            col_median_grade,
-            cur_col_intentions,
-            official_lib,
-            reversed,
-        )
-        # refill the dataframe of surveys
-        df[df["id"] == survey] = df_with_rank
+    if backend is None:
+        # for majority-judgment-tracker has I kept percentages instead of votes, all surveys are ranked at once
+        backend = "official" if official_lib else "batch_exact" if exact else "batch"
+
+    return apply_backend_mj(
+        df, col_rank, col_median_grade, col_intentions, backend, reversed, cache, margins, col_score, method, max_votes
+    )
 
-    return df
 
+def _apply_mj_batch(args: tuple) -> DataFrame:
+    df, kwargs = args
+    return apply_mj(df, **kwargs)
 
-def sort_candidates_mj(
+
+def apply_mj_parallel(
     df: DataFrame,
-    nb_grades: int,
-    col_rank: str = None,
-    col_median_grade: str = None,
-    col_intentions: List[str] = None,
+    nb_workers: int,
+    rolling_mj: bool = False,
     official_lib: bool = False,
     reversed: bool = True,
+    exact: bool = False,
+    batches_per_worker: int = 4,
+    backend: str = None,
+    margins: bool = False,
+    method: str = "majority",
+    max_votes: int = None,
 ):
     """
-    Reindexing candidates in the dataFrame following majority judgment rules
+    Rank batches of surveys in a pool of processes, the surveys being independent of each others
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey
+    nb_workers: int
+        number of worker processes
+    rolling_mj: bool
+        if we apply rolling majority judgment
+    official_lib: bool
+        if we use the official majority judgment lib from MieuxVoter
+    reversed: bool
+        if the intentions are given from the best grade to the worst grade
+    exact: bool
+        if the percentages are converted into integer tallies with the sample size (echantillon)
+    batches_per_worker: int
+        number of batches of surveys sent to each worker, to balance the load
+    backend: str
+        name of the majority judgment backend
+    margins: bool
+        if the votes needed to swap each pair of candidates are stored
+    method: str
+        tie-breaking rule of the highest median
+    max_votes: int
+        maximum number of votes of a survey expanded to call the official lib
+    Returns
+    -------
+    Return the DataFrame df with the rank within majority judgment rules for all studies
+    """
+    col_rank = "rang_glissant" if rolling_mj else "rang"
+    col_median_grade = "mention_majoritaire_glissante" if rolling_mj else "mention_majoritaire"
+    col_score = "score_glissant" if rolling_mj else "score"
+    col_margins = f"marge_{col_rank}"
+    kwargs = dict(
+        rolling_mj=rolling_mj,
+        official_lib=official_lib,
+        reversed=reversed,
+        exact=exact,
+        backend=backend,
+        margins=margins,
+        method=method,
+        max_votes=max_votes,
+    )
+
+    survey_idx, surveys = pd.factorize(df["id"])
+    batch_idx = np.array_split(np.arange(len(surveys)), nb_workers * batches_per_worker)
+    batch_rows = [np.flatnonzero(np.isin(survey_idx, idx)) for idx in batch_idx if len(idx)]
+    batches = [(df.iloc[rows], kwargs) for rows in batch_rows]
+    with Pool(nb_workers) as pool:
+        # map keeps the order of the batches, so that the output does not depend on the scheduling
+        df_ranked = pd.concat(pool.map(_apply_mj_batch, batches))
+
+    # the results are written back by position, the index of df may have duplicates
+    positions = np.concatenate(batch_rows)
+    for col in [col_rank, col_median_grade, col_score] + ([col_margins] if margins else []):
+        values = df_ranked[col].to_numpy()
+        df[col] = values[np.argsort(positions)]
+    return df
+
+
+def apply_mj_segments(df: DataFrame, col_segment: str = "segment", **kwargs):
+    """
+    Rank the surveys of all the segments of a DataFrame in a single call of apply_mj,
+    a survey being identified by its segment and its id (see load_surveys.load_segmented_surveys)
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey of all the segments
+    col_segment: str
+        col of the key of the segment
+    kwargs:
+        arguments of apply_mj
+    Returns
+    -------
+    Return the DataFrame df with the rank within majority judgment rules for all studies of all segments
+    """
+    ids = df["id"].to_numpy()
+    df["id"] = df[col_segment].astype(str).to_numpy() + "/" + df["id"].astype(str).to_numpy()
+    df = apply_mj(df, **kwargs)
+    df["id"] = ids
+    return df
+
+
+def apply_backend_mj(
+    df: DataFrame,
+    col_rank: str,
+    col_median_grade: str,
+    col_intentions: List[str],
+    backend: str = "batch",
+    reversed: bool = True,
+    cache: MajorityJudgmentCache = None,
+    margins: bool = False,
+    col_score: str = None,
+    method: str = "majority",
+    max_votes: int = None,
+):
+    """
+    Rank the candidates of all the surveys at once with a majority judgment backend
 
     Parameters
     ----------
     df: DataFrame
         contains all the data of vote / survey
-    nb_grades: int
-        number of grades
     col_rank: str
         rank col to considered (ex: rang or rang_glissant)
     col_median_grade: str
         rank col to considered (ex: mention_majoritaire or mention_majoritaire_glissante)
     col_intentions: list[str]
         col of intentions to considered (ex: _roll or not)
-    official_lib: bool
-        if we use the official majority judgment lib from MieuxVoter
+    backend: str
+        name of the backend, see libs.backends
+    reversed: bool
+        if the intentions are given from the best grade to the worst grade
+    cache: MajorityJudgmentCache
+        memoization of the results of the surveys already ranked
+    margins: bool
+        if the votes needed to swap each pair of candidates (see majority_judgment_batch.flip_margins) are stored
+        in the col marge_{col_rank}, as an array for each candidate ordered by rank: the k-th value is the percentage
+        of respondents whose grades must change to swap the candidate with the one ranked k.
+    col_score: str
+        col of the score of 'La recherche' (see majority_judgment_batch.la_recherche_scores), not computed if None
+    method: str
+        tie-breaking rule of the highest median, only available for the backends batch and batch_exact
+    max_votes: int
+        maximum number of votes of a survey expanded to call the official lib (backend official),
+        the largest sample size (echantillon) of df if None. The backend official is the reference to check the
+        other backends, so by default every survey is expanded into votes and ranked by the official lib itself;
+        a lower max_votes bounds the memory, the larger surveys being ranked from their tallies with the same
+        majority values (see libs.backends.interface_to_official_lib).
     Returns
     -------
-    Return the DataFrame df sorted with the rank within majority judgment rules.
+    Return the DataFrame df with the rank within majority judgment rules for all studies
     """
-    col_rank = "rang" if col_rank is None else col_rank
-    col_median_grade = "mention_majoritaire" if col_median_grade is None else col_median_grade
-
-    nb_candidates = len(df)
-    # todo: get the df with this intention_col
-    # df_intentions = get_intentions(df, nb_grades)
-    colheader = ["candidat"]
-    colheader.extend(col_intentions)
-    df_intentions = df[colheader]
-    merit_profiles_dict = set_dictionary(df_intentions, nb_grades, nb_candidates)
-    # ranking, best_grades = mj(merit_profiles_dict, reverse=True)
-
-    if official_lib:
-        ranking, best_grades = interface_to_official_lib(merit_profiles_dict, reverse=reversed)
-    else:
-        # for majority-judgment-tracker has I kept percentages instead of votes, this method is preferred
-        ranking, best_grades = mj(merit_profiles_dict, reverse=reversed)
+    rank_function = get_backend(backend)
+    if method != "majority":
+        if backend not in TIE_BREAKING_BACKENDS:
+            raise ValueError(f"The tie-breaking method {method} needs one of the backends {TIE_BREAKING_BACKENDS}")
+        rank_function = partial(rank_function, method=method)
+    # only the backends counting votes read the sample sizes, the others rank the percentages as they are
+    merit_profiles, survey_idx, candidate_idx = MeritProfiles.from_dataframe(
+        df, col_intentions, reverse=reversed, col_sample_size="echantillon" if backend in SAMPLE_SIZE_BACKENDS else None
+    )
+    profiles, candidate_mask = merit_profiles.profiles, merit_profiles.candidate_mask
+    if backend == "official":
+        max_votes = merit_profiles.sample_sizes.max(initial=0) if max_votes is None else max_votes
+        rank_function = partial(rank_function, max_votes=max_votes)
 
-    if col_rank not in df.columns:
-        df[col_rank] = None
-    if col_median_grade not in df.columns:
-        df[col_median_grade] = None
+    if cache is None:
+        ranks, median_grades = rank_function(merit_profiles)
+    else:
+        ranks, median_grades = cache.rank_surveys(merit_profiles, rank_function, f"{backend}-{reversed}-{method}")
 
-    col_rank = df.columns.get_loc(col_rank)
-    col_best_grade = df.columns.get_loc(col_median_grade)
-    for c in ranking:
-        idx = np.where(df["candidat"] == c)[0][0]
-        df.iat[idx, col_rank] = ranking[c]
+    df[col_rank] = ranks[survey_idx, candidate_idx]
+    df[col_median_grade] = get_grade_labels(df, median_grades[survey_idx, candidate_idx], reversed)
 
-    grade_list = get_grades(df)
-    if not reversed:
-        grade_list.reverse()
+    if col_score is not None:
+        totals = batch_mj.total_votes(profiles, candidate_mask)
+        scores = batch_mj.la_recherche_scores(profiles, batch_mj.median_grades(profiles, totals), totals)
+        df[col_score] = scores[survey_idx, candidate_idx]
 
-    for c, val in best_grades.items():
-        print(c, grade_list[val])
-        idx = np.where(df["candidat"] == c)[0][0]
-        df.iat[idx, col_best_grade] = grade_list[val]
+    if margins:
+        pair_margins = batch_mj.flip_margins(profiles, candidate_mask, merit_profiles.grade_mask)
+        # candidate index of each rank of each survey
+        ranked_candidates = np.zeros(candidate_mask.shape, dtype=int)
+        surveys = np.broadcast_to(np.arange(ranks.shape[0])[:, None], ranks.shape)
+        ranked_candidates[surveys[candidate_mask], ranks[candidate_mask] - 1] = np.where(candidate_mask)[1]
+        row_margins = np.take_along_axis(pair_margins[survey_idx, candidate_idx], ranked_candidates[survey_idx], axis=1)
+        # the intentions have one decimal and the margins are halves of their sums, two decimals remove the float noise
+        row_margins = np.round(row_margins, 2)
+        nb_candidates = candidate_mask.sum(axis=1)[survey_idx]
+        df[f"marge_{col_rank}"] = [m[:n] for m, n in zip(row_margins, nb_candidates)]
 
     return df
 
 
-def set_dictionary(df_intentions: DataFrame, nb_grades: int, nb_candidates: int):
+def get_grade_labels(df: DataFrame, grade_idx: np.ndarray, reversed: bool = True) -> np.ndarray:
     """
-    Convert a DataFrame of votes into a dictionary Dict[str, list] containing the number of grades for
-    each candidate
+    Get the label of a grade for each row of the DataFrame, without looping over surveys
 
     Parameters
     ----------
-    df_intentions: DataFrame
-        contains only all votes for each grade
-    nb_grades: int
-        number of grades
-    nb_candidates: int,
-        number of candidates
+    df: DataFrame
+        contains all the data of vote / survey
+    grade_idx: np.ndarray
+        index of the grade for each row of df, as returned by the majority judgment
+    reversed: bool
+        if the grade index goes from the worst grade to the best grade
     Returns
     -------
-    a dictionary Dict[str, list] containing the number of grades for
-    each candidate
+    The array of labels of grades, one for each row of df
     """
-    return {
-        df_intentions["candidat"].iloc[i]: [df_intentions.iloc[i, j + 1] for j in range(nb_grades)]
-        for i in range(nb_candidates)
-    }
+    labels = df[[f"mention_{i}" for i in range(1, 8)]].to_numpy()
+    available = pd.notna(labels) & (labels != "nan")
+    if reversed:
+        grade_idx = available.sum(axis=1) - 1 - grade_idx
+    # position of the (grade_idx + 1)-th available label of each row
+    position = np.argmax(np.cumsum(available, axis=1) == grade_idx[:, None] + 1, axis=1)
+    return labels[np.arange(len(labels)), position]
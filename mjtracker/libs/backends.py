@@ -0,0 +1,314 @@
+"""
+Registry of the majority judgment implementations, selectable by name in interface_mj.apply_mj.
+
+Every backend ranks the merit profiles of a batch of surveys (see merit_profiles.MeritProfiles), from the worst grade
+to the best grade, and returns the ranks and the index of the median grade of each candidate of each survey.
+"""
+from typing import Callable, Dict, List, Tuple
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import majority_judgment_batch as batch_mj
+from .majority_judgment_2 import majority_judgment as fabre_mj, to_tallies
+from .majority_judgment import (
+    MajorityValue,
+    MajorityValues,
+    majority_gauges,
+    rank_by_gauge,
+    sort_by_value_with_index,
+)
+from .merit_profiles import MeritProfiles
+
+# merit_profiles -> (ranks, median_grades)
+Backend = Callable[[MeritProfiles], Tuple[np.ndarray, np.ndarray]]
+
+BACKENDS: Dict[str, Backend] = {}
+
+
+def register_backend(name: str):
+    """
+    Register a majority judgment backend under a name
+
+    Parameters
+    ----------
+    name: str
+        name of the backend, as given to apply_mj
+    """
+
+    def decorator(backend: Backend) -> Backend:
+        BACKENDS[name] = backend
+        return backend
+
+    return decorator
+
+
+def get_backend(name: str) -> Backend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown majority judgment backend {name}, available backends are {list(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def merit_profiles_to_tallies(merit_profiles_dict: dict, sample_size: int = None) -> Dict[str, np.ndarray]:
+    """
+    Convert merit profiles into integer tallies, the same total of votes for each candidate.
+    Percentages are scaled to the sample size with the largest remainder method.
+
+    Parameters
+    ----------
+    merit_profiles_dict: dict
+        number or percentage of votes for each grade of each candidate
+    sample_size: int
+        number of respondents of the survey (echantillon)
+    Returns
+    -------
+    a dictionary Dict[str, np.ndarray] containing the number of votes for each grade of each candidate
+    """
+    if sample_size is None:
+        tallies = {k: np.asarray(v) for k, v in merit_profiles_dict.items()}
+        if any(not np.array_equal(np.round(v), v) for v in tallies.values()):
+            raise ValueError("The sample size is required to convert percentages into tallies.")
+        tallies = {k: v.astype(int) for k, v in tallies.items()}
+        if not len({int(v.sum()) for v in tallies.values()}) == 1:
+            raise NotImplementedError("Unbalanced grades have not been implemented yet.")
+        return tallies
+
+    return {k: to_tallies(v, sample_size) for k, v in merit_profiles_dict.items()}
+
+
+def interface_to_official_lib(merit_profiles_dict: dict, reverse: bool, sample_size: int = None, max_votes: int = None):
+    """
+    Rank the candidates with the majority values of the official lib from the tallies of the merit profiles.
+
+    The official lib only accepts one grade per voter, so the tallies are expanded into votes, unless the number
+    of votes is greater than max_votes. Then, the same majority values are computed from the tallies
+    (see libs.majority_judgment.MajorityValues), within a memory bounded by the number of grades.
+
+    source: https://github.com/MieuxVoter/majority-judgment-library-python/tree/main
+
+    Parameters
+    ----------
+    merit_profiles_dict: dict
+        number or percentage of votes for each grade of each candidate, from the best grade to the worst grade
+    reverse: bool
+        if the grades are given from the best to the worst grade
+    sample_size: int
+        number of respondents of the survey (echantillon), to convert percentages into tallies
+    max_votes: int
+        maximum number of votes expanded to call the official lib, always expanded if None
+    Returns
+    -------
+        Rank order for each candidates in a Dictionary Dict[str, rank: int]
+        best_grades Dict[str, grade: int]
+    """
+    tallies = merit_profiles_to_tallies(merit_profiles_dict, sample_size)
+    num_votes = int(next(iter(tallies.values())).sum())
+
+    if max_votes is None or num_votes <= max_votes:
+        from majority_judgment import majority_judgment as mj
+        from majority_judgment import median_grade
+
+        official_merit_profiles_dict = {k: np.repeat(np.arange(len(v)), v).tolist() for k, v in tallies.items()}
+        best_grades = {k: median_grade(np.cumsum(v) / np.sum(v)) for k, v in tallies.items()}
+        return mj(official_merit_profiles_dict, reverse=reverse), best_grades
+
+    num_grades = len(next(iter(tallies.values())))
+    # the higher the better for majority values
+    values = {
+        k: MajorityValues.from_profile({(num_grades - 1 - g if reverse else g): int(n) for g, n in enumerate(v)})
+        for k, v in tallies.items()
+    }
+    bests = sorted(values, key=values.get, reverse=True)
+    ranking = {c: i + 1 for i, c in enumerate(bests)}
+    best_grades = {k: (num_grades - 1 - v[0] if reverse else v[0]) for k, v in values.items()}
+
+    return ranking, best_grades
+
+
+def _rank_surveys_one_by_one(merit_profiles: MeritProfiles, rank_survey: Callable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Apply a backend which ranks a single survey, given as a (nb_candidates, nb_grades) array, to all the surveys
+    """
+    candidate_mask, grade_mask = merit_profiles.candidate_mask, merit_profiles.grade_mask
+    ranks = np.zeros(candidate_mask.shape, dtype=int)
+    median_grades = np.zeros(candidate_mask.shape, dtype=int)
+    for s in range(len(merit_profiles)):
+        nb_candidates, nb_grades = candidate_mask[s].sum(), grade_mask[s].sum()
+        ranks[s, :nb_candidates], median_grades[s, :nb_candidates] = rank_survey(
+            merit_profiles.profiles[s, :nb_candidates, :nb_grades], s
+        )
+    return ranks, median_grades
+
+
+@register_backend("batch")
+def batch_backend(merit_profiles: MeritProfiles, method: str = "majority"):
+    return batch_mj.majority_judgment(merit_profiles.profiles, merit_profiles.candidate_mask, method=method)
+
+
+@register_backend("batch_exact")
+def batch_exact_backend(merit_profiles: MeritProfiles, method: str = "majority"):
+    return batch_mj.majority_judgment(
+        merit_profiles.profiles,
+        merit_profiles.candidate_mask,
+        exact=True,
+        sample_sizes=merit_profiles.sample_sizes,
+        method=method,
+    )
+
+
+# backends accepting the tie-breaking rules of majority_judgment_batch.METHODS
+TIE_BREAKING_BACKENDS = ("batch", "batch_exact")
+# backends converting the percentages into votes with the sample size (echantillon) of each survey
+SAMPLE_SIZE_BACKENDS = ("batch_exact", "value", "official")
+
+
+@register_backend("fabre")
+def fabre_backend(merit_profiles: MeritProfiles):
+    def rank_survey(profile: np.ndarray, survey: int):
+        ranking, median_grades = fabre_mj({c: list(p) for c, p in enumerate(profile)})
+        return [ranking[c] for c in range(len(profile))], [median_grades[c] for c in range(len(profile))]
+
+    return _rank_surveys_one_by_one(merit_profiles, rank_survey)
+
+
+@register_backend("gauge")
+def gauge_backend(merit_profiles: MeritProfiles):
+    gauges = majority_gauges(merit_profiles.profiles)
+    order = rank_by_gauge(gauges, merit_profiles.candidate_mask)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, order.shape[-1] + 1)[None, :], axis=-1)
+    return ranks, gauges["grade"]
+
+
+@register_backend("value")
+def value_backend(merit_profiles: MeritProfiles):
+    sample_sizes = merit_profiles.sample_sizes
+
+    def rank_survey(profile: np.ndarray, survey: int):
+        # majority values are defined on numbers of votes
+        tallies = to_tallies(profile, None if sample_sizes is None else sample_sizes[survey], decimals=0)
+        values = [MajorityValue({g: int(n) for g, n in enumerate(t)}) for t in tallies]
+        ranks = np.empty(len(values), dtype=int)
+        ranks[[c for c, _ in sort_by_value_with_index(values)]] = np.arange(1, len(values) + 1)
+        return ranks, [v.grade for v in values]
+
+    return _rank_surveys_one_by_one(merit_profiles, rank_survey)
+
+
+@register_backend("official")
+def official_backend(merit_profiles: MeritProfiles, max_votes: int = None):
+    """
+    Backend of the official majority judgment lib, see interface_to_official_lib
+    """
+    profiles, candidate_mask = merit_profiles.profiles, merit_profiles.candidate_mask
+    sample_sizes = merit_profiles.sample_sizes
+    ranks = np.zeros(candidate_mask.shape, dtype=int)
+    best_grades = np.zeros(candidate_mask.shape, dtype=int)
+    for survey in range(len(merit_profiles)):
+        nb_grades = merit_profiles.grade_mask[survey].sum()
+        merit_profiles_dict = {c: profiles[survey, c, :nb_grades] for c in np.where(candidate_mask[survey])[0]}
+        # packed profiles go from the worst grade to the best grade
+        ranking, survey_best_grades = interface_to_official_lib(
+            merit_profiles_dict,
+            reverse=False,
+            sample_size=None if sample_sizes is None else sample_sizes[survey],
+            max_votes=max_votes,
+        )
+        ranks[survey, list(ranking)] = list(ranking.values())
+        best_grades[survey, list(survey_best_grades)] = list(survey_best_grades.values())
+    return ranks, best_grades
+
+
+def synthetic_profiles(
+    nb_surveys: int, nb_candidates: int, nb_grades: int, nb_voters: int, seed: int = 0
+) -> MeritProfiles:
+    """
+    Draw random merit profiles of surveys, each candidate with the same number of voters
+
+    Parameters
+    ----------
+    nb_surveys: int
+        number of surveys
+    nb_candidates: int
+        number of candidates in each survey
+    nb_grades: int
+        number of grades in each survey
+    nb_voters: int
+        number of voters of each survey
+    seed: int
+        seed of the random generator
+    Returns
+    -------
+    The merit profiles of the surveys, from the worst grade to the best grade
+    """
+    rng = np.random.default_rng(seed)
+    proportions = rng.dirichlet(np.ones(nb_grades), size=(nb_surveys, nb_candidates))
+    profiles = rng.multinomial(nb_voters, proportions).astype(float)
+    return MeritProfiles(profiles, sample_sizes=np.full(nb_surveys, nb_voters))
+
+
+def benchmark_backends(
+    backends: List[str] = None,
+    nb_surveys: int = 100,
+    nb_candidates: List[int] = None,
+    nb_grades: List[int] = None,
+    nb_voters: List[int] = None,
+    reference: str = "batch",
+    repeat: int = 3,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Time each backend on synthetic profiles and compare its ranking with the reference backend
+
+    Parameters
+    ----------
+    backends: List[str]
+        names of the backends to benchmark, all the registered backends if None
+    nb_surveys: int
+        number of surveys of each workload
+    nb_candidates: List[int]
+        numbers of candidates of the workloads
+    nb_grades: List[int]
+        numbers of grades of the workloads
+    nb_voters: List[int]
+        numbers of voters of the workloads
+    reference: str
+        backend whose ranking is the reference
+    repeat: int
+        number of runs of each backend, the best time is kept
+    seed: int
+        seed of the random generator
+    Returns
+    -------
+    The DataFrame of the best time of each backend on each workload, and of the share of surveys
+    whose ranking agrees with the reference backend
+    """
+    backends = list(BACKENDS) if backends is None else backends
+    nb_candidates = [4, 12] if nb_candidates is None else nb_candidates
+    nb_grades = [4, 7] if nb_grades is None else nb_grades
+    nb_voters = [1000, 100_000] if nb_voters is None else nb_voters
+
+    rows = []
+    for n_candidates in nb_candidates:
+        for n_grades in nb_grades:
+            for n_voters in nb_voters:
+                workload = synthetic_profiles(nb_surveys, n_candidates, n_grades, n_voters, seed)
+                reference_ranks, _ = get_backend(reference)(workload)
+                for name in backends:
+                    times = []
+                    for _ in range(repeat):
+                        tic = time.perf_counter()
+                        ranks, _ = get_backend(name)(workload)
+                        times.append(time.perf_counter() - tic)
+                    rows.append(
+                        dict(
+                            backend=name,
+                            nb_candidates=n_candidates,
+                            nb_grades=n_grades,
+                            nb_voters=n_voters,
+                            time_per_survey_ms=1000 * min(times) / nb_surveys,
+                            agreement=(ranks == reference_ranks).all(axis=1).mean(),
+                        )
+                    )
+    return pd.DataFrame(rows)
@@ -0,0 +1,151 @@
+"""
+Streaming ingestion of raw ballots into merit profiles.
+
+A ballot file contains one row per voter and one column per candidate, each cell being the grade given by the voter.
+Ballots are read by chunks and counted with a single np.bincount per chunk, so that exports of tens of millions of
+rows are turned into merit profiles within a memory bounded by the chunk size, ready for every backend of
+libs.backends.
+"""
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple, Union
+from multiprocessing import Pool
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from .merit_profiles import MeritProfiles
+
+Grade = int
+
+
+def count_grades(chunk: np.ndarray, grades: Sequence[Grade]) -> np.ndarray:
+    """
+    Count the number of votes for each grade of each candidate in a chunk of ballots
+
+    Parameters
+    ----------
+    chunk: np.ndarray
+        (nb_voters, nb_candidates) grade given by each voter to each candidate, NaN meaning no grade given
+    grades: Sequence[Grade]
+        List of grade of the vote, ex: [1,2,3], meaning voters can only attribute 1, 2 or 3.
+
+    Returns
+    -------
+    (nb_candidates, nb_grades) the number of votes for each grade of each candidate, in the order of grades
+    """
+    grades = np.asarray(grades)
+    nb_candidates = chunk.shape[1]
+    order = np.argsort(grades)
+    sorted_grades = grades[order]
+
+    chunk = np.asarray(chunk)
+    voted = ~np.isnan(chunk) if chunk.dtype.kind == "f" else np.ones(chunk.shape, dtype=bool)
+    values = chunk[voted]
+    slots = np.searchsorted(sorted_grades, values)
+    slots = np.minimum(slots, len(grades) - 1)
+    if not np.array_equal(sorted_grades[slots], values):
+        raise ValueError(f"Unexpected grades {np.setdiff1d(values, grades)}, grades should be in {list(grades)}")
+
+    candidates = np.broadcast_to(np.arange(nb_candidates), chunk.shape)[voted]
+    counts = np.bincount(candidates * len(grades) + order[slots], minlength=nb_candidates * len(grades))
+    return counts.reshape(nb_candidates, len(grades))
+
+
+def read_ballots(
+    ballot_file: Path, chunk_size: int = 1_000_000, candidates: List[str] = None
+) -> Tuple[List[str], Iterator[np.ndarray]]:
+    """
+    Read a ballot file by chunks of voters
+
+    Parameters
+    ----------
+    ballot_file: Path
+        .csv file with candidates as header, or .npy file of shape (nb_voters, nb_candidates)
+    chunk_size: int
+        number of voters read at once
+    candidates: List[str]
+        names of the candidates, required for .npy files which have no header
+
+    Returns
+    -------
+    The names of the candidates and an iterator over the chunks of ballots
+    """
+    ballot_file = Path(ballot_file)
+    if ballot_file.suffix == ".npy":
+        ballots = np.load(ballot_file, mmap_mode="r")
+        if candidates is None:
+            candidates = [str(i) for i in range(ballots.shape[1])]
+        chunks = (np.asarray(ballots[i : i + chunk_size]) for i in range(0, ballots.shape[0], chunk_size))
+        return candidates, chunks
+
+    header = pd.read_csv(ballot_file, nrows=0).columns.to_list()
+    if candidates is None:
+        candidates = header
+    reader = pd.read_csv(ballot_file, chunksize=chunk_size)
+    return candidates, (df_chunk.to_numpy(dtype=float) for df_chunk in reader)
+
+
+def _count_npy_slice(args: Tuple[Path, int, int, Sequence[Grade]]) -> np.ndarray:
+    ballot_file, start, stop, grades = args
+    ballots = np.load(ballot_file, mmap_mode="r")
+    return count_grades(np.asarray(ballots[start:stop]), grades)
+
+
+def _count_chunk(args: Tuple[np.ndarray, Sequence[Grade]]) -> np.ndarray:
+    chunk, grades = args
+    return count_grades(chunk, grades)
+
+
+def ballots_to_merit_profiles(
+    ballot_file: Union[Path, str],
+    grades: Sequence[Grade],
+    chunk_size: int = 1_000_000,
+    candidates: List[str] = None,
+    nb_workers: int = None,
+) -> MeritProfiles:
+    """
+    Stream a ballot file into merit profiles, optionally counting the chunks in several worker processes
+
+    Parameters
+    ----------
+    ballot_file: Union[Path, str]
+        .csv file with candidates as header, or .npy file of shape (nb_voters, nb_candidates)
+    grades: Sequence[Grade]
+        List of grade of the vote, from the best grade to the worst grade
+    chunk_size: int
+        number of voters read at once
+    candidates: List[str]
+        names of the candidates, required for .npy files which have no header
+    nb_workers: int
+        number of worker processes, the chunks are counted in the current process if None
+
+    Returns
+    -------
+    The merit profiles of the ballots as a single survey (named after the file), with the grades as labels
+    """
+    ballot_file = Path(ballot_file)
+    candidates, chunks = read_ballots(ballot_file, chunk_size, candidates)
+    counts = np.zeros((len(candidates), len(grades)), dtype=np.int64)
+
+    if nb_workers is None:
+        for chunk in chunks:
+            counts += count_grades(chunk, grades)
+    elif ballot_file.suffix == ".npy":
+        # each worker maps its own slice of the file, nothing but the counts is sent between processes
+        nb_voters = np.load(ballot_file, mmap_mode="r").shape[0]
+        tasks = [(ballot_file, i, i + chunk_size, grades) for i in range(0, nb_voters, chunk_size)]
+        with Pool(nb_workers) as pool:
+            for chunk_counts in pool.imap_unordered(_count_npy_slice, tasks):
+                counts += chunk_counts
+    else:
+        with Pool(nb_workers) as pool:
+            # a few chunks per worker at a time, so that parsing does not get ahead of counting
+            while True:
+                batch = [(chunk, grades) for chunk in islice(chunks, 2 * nb_workers)]
+                if not batch:
+                    break
+                for chunk_counts in pool.imap_unordered(_count_chunk, batch):
+                    counts += chunk_counts
+
+    return MeritProfiles.from_dict(dict(zip(candidates, counts)), grades, survey=ballot_file.stem)
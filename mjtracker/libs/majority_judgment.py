@@ -1,8 +1,12 @@
-from typing import List, Tuple, Dict
-from dataclasses import dataclass, field
-from operator import attrgetter
+from typing import List, Tuple, Dict, Iterator, Union
+from dataclasses import dataclass
+from functools import total_ordering
+from itertools import accumulate
+from bisect import bisect_right
 import math
 
+import numpy as np
+
 Grade = int
 
 
@@ -46,6 +50,90 @@ def majority_grade(scores: List[int]) -> int:
 
 # Using gauge for a fast algorithm
 # However, it creates paradoxical results with a lower number of votes
+GAUGE_DTYPE = np.dtype(
+    [("grade", np.int64), ("above", np.float64), ("below", np.float64), ("sign", np.int64), ("gauge", np.float64)]
+)
+
+
+def majority_gauges(profiles: np.ndarray) -> np.ndarray:
+    """
+    Compute the majority gauges of many candidates of many polls at once
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (..., num_grades) number of votes for each grade, from the worst grade to the best grade
+
+    Returns
+    -------
+    (...) structured array of GAUGE_DTYPE, as MajorityGauge:
+    grade: index of the majority grade, as majority_grade
+    above: rate of votes for the grades of lower index than the majority grade, the worse grades
+    below: rate of votes for the grades of higher index than the majority grade, the better grades
+    sign: 1 if more votes above than below, else -1
+    gauge: the largest of above and below
+    """
+    profiles = np.asarray(profiles, dtype=np.float64)
+    num_grades = profiles.shape[-1]
+    total = profiles.sum(axis=-1)
+    # from the best grade, the first one to gather half of the votes
+    from_best = np.cumsum(profiles[..., ::-1], axis=-1)
+    mid = np.ceil(total / 2.0)
+    grade = num_grades - 1 - np.argmax(from_best >= mid[..., None], axis=-1)
+
+    grades = np.arange(num_grades)
+    total = np.where(total > 0, total, 1.0)
+    gauges = np.empty(profiles.shape[:-1], dtype=GAUGE_DTYPE)
+    gauges["grade"] = grade
+    gauges["above"] = np.where(grades < grade[..., None], profiles, 0.0).sum(axis=-1) / total
+    gauges["below"] = np.where(grades > grade[..., None], profiles, 0.0).sum(axis=-1) / total
+    gauges["sign"] = np.where(gauges["above"] > gauges["below"], 1, -1)
+    gauges["gauge"] = np.maximum(gauges["above"], gauges["below"])
+    return gauges
+
+
+def rank_by_gauge(gauges: np.ndarray, candidate_mask: np.ndarray = None) -> np.ndarray:
+    """
+    Rank the candidates of each poll with a single lexsort on (grade, sign, gauge)
+
+    A higher majority grade comes first, then the candidates with more votes for better grades (sign -1),
+    with the largest rate of better grades first, then the others with the smallest rate of worse grades first.
+
+    Parameters
+    ----------
+    gauges: np.ndarray
+        (..., num_candidates) structured array computed by majority_gauges
+    candidate_mask: np.ndarray
+        (..., num_candidates) True for the candidates available in each poll, the others come last
+
+    Returns
+    -------
+    (..., num_candidates) indexes of the candidates of each poll, from the best to the worst one
+    """
+    grade = -gauges["grade"]
+    if candidate_mask is not None:
+        grade = np.where(candidate_mask, grade, np.iinfo(np.int64).max)
+    return np.lexsort((gauges["sign"] * gauges["gauge"], gauges["sign"], grade), axis=-1)
+
+
+def sort_by_gauge_batch(profiles: np.ndarray, candidate_mask: np.ndarray = None) -> np.ndarray:
+    """
+    Rank the candidates of many polls at once with the majority gauge
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (num_polls, num_candidates, num_grades) number of votes for each grade, from the worst grade to the best grade
+    candidate_mask: np.ndarray
+        (num_polls, num_candidates) True for the candidates available in each poll
+
+    Returns
+    -------
+    (num_polls, num_candidates) indexes of the candidates of each poll, from the best to the worst one
+    """
+    return rank_by_gauge(majority_gauges(profiles), candidate_mask)
+
+
 @dataclass
 class MajorityGauge:
     profile: List[int]
@@ -56,24 +144,24 @@ class MajorityGauge:
     gauge: float = 0.0
 
     def __post_init__(self):
-        self.grade = majority_grade(self.profile)
-        total: int = sum(self.profile)
-        self.above = sum(self.profile[: self.grade]) / total
-        self.below = sum(self.profile[1 + self.grade :]) / total
-        self.sign = 1 if self.above > self.below else -1
-        self.gauge = max(self.above, self.below)
+        gauge = majority_gauges(self.profile)
+        self.grade = int(gauge["grade"])
+        self.above = float(gauge["above"])
+        self.below = float(gauge["below"])
+        self.sign = int(gauge["sign"])
+        self.gauge = float(gauge["gauge"])
+
+
+def _gauges_to_array(gauges: List[MajorityGauge]) -> np.ndarray:
+    return np.array([(g.grade, g.above, g.below, g.sign, g.gauge) for g in gauges], dtype=GAUGE_DTYPE)
 
 
 def sort_by_gauge(gauges: List[MajorityGauge]) -> List[MajorityGauge]:
-    by_gauge: List[MajorityGauge] = sorted(gauges, key=attrgetter("gauge"))
-    by_sign: List[MajorityGauge] = sorted(by_gauge, key=attrgetter("sign"))
-    return sorted(by_sign, key=attrgetter("grade"), reverse=True)
+    return [gauges[i] for i in rank_by_gauge(_gauges_to_array(gauges))]
 
 
 def sort_by_gauge_with_index(gauges: List[MajorityGauge]) -> List[Tuple[int, MajorityGauge]]:
-    by_gauge: List[Tuple[int, MajorityGauge]] = sorted(enumerate(gauges), key=lambda x: getattr(x[1], "gauge"))
-    by_sign: List[Tuple[int, MajorityGauge]] = sorted(by_gauge, key=lambda x: getattr(x[1], "sign"))
-    return sorted(by_sign, key=lambda x: getattr(x[1], "grade"))
+    return [(int(i), gauges[i]) for i in rank_by_gauge(_gauges_to_array(gauges))]
 
 
 # Long way but no ambiguity
@@ -92,21 +180,124 @@ def majority_grade_from_votes(votes: List[int]):
     return votes[(len(votes) - 1) // 2]
 
 
+@total_ordering
+class MajorityValues:
+    """
+    Sequence of majority values of a merit profile, computed from the grade counts without expanding the votes.
+
+    The k-th majority value is the majority grade of the votes left once the k-1 previous ones are removed.
+    Once the first (odd number of votes) or two first (even number of votes) values are taken, the next ones go by
+    pairs (lower, upper) moving away from the median in the sorted votes, and both grades of a pair only change at
+    the boundaries of the grades. The sequence is thus stored as at most 2 * num_grades segments (pattern, repeat),
+    and sequences are compared lazily segment by segment, as lists would be.
+    """
+
+    __slots__ = ("segments", "length")
+
+    def __init__(self, segments: List[Tuple[Tuple[Grade, ...], int]]):
+        self.segments = [(pattern, repeat) for pattern, repeat in segments if repeat > 0]
+        self.length = sum(len(pattern) * repeat for pattern, repeat in self.segments)
+
+    @classmethod
+    def from_profile(cls, profile: Dict[Grade, int]) -> "MajorityValues":
+        grades: List[Grade] = sorted(g for g, num in profile.items() if num > 0)
+        # index of the first vote after each grade, in the sorted votes
+        ends: List[int] = list(accumulate(profile[g] for g in grades))
+        num_votes: int = ends[-1] if ends else 0
+        if num_votes == 0:
+            return cls([])
+
+        def slot(vote: int) -> int:
+            return bisect_right(ends, vote)
+
+        low: int = (num_votes - 1) // 2
+        high: int = low + 1 - num_votes % 2
+        segments = [(tuple(grades[slot(v)] for v in range(low, high + 1)), 1)]
+        k: int = 1
+        while k <= low:
+            slot_low, slot_high = slot(low - k), slot(high + k)
+            start_low: int = ends[slot_low - 1] if slot_low > 0 else 0
+            repeat: int = min(low - k - start_low + 1, ends[slot_high] - high - k, low - k + 1)
+            segments.append(((grades[slot_low], grades[slot_high]), repeat))
+            k += repeat
+        return cls(segments)
+
+    @classmethod
+    def from_list(cls, values: List[Grade]) -> "MajorityValues":
+        return cls([((v,), 1) for v in values])
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Grade]:
+        for pattern, repeat in self.segments:
+            for _ in range(repeat):
+                yield from pattern
+
+    def __getitem__(self, index: int) -> Grade:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("majority value index out of range")
+        for pattern, repeat in self.segments:
+            size = len(pattern) * repeat
+            if index < size:
+                return pattern[index % len(pattern)]
+            index -= size
+
+    def __repr__(self) -> str:
+        return f"MajorityValues({self.segments})"
+
+    def _compare(self, other: Union["MajorityValues", List[Grade]]) -> int:
+        """
+        Lexicographic comparison of two sequences of majority values, -1, 0 or 1 as cmp would return
+        """
+        if not isinstance(other, MajorityValues):
+            other = MajorityValues.from_list(list(other))
+        a, b = self.segments, other.segments
+        i = j = 0  # current segments
+        offset_a = offset_b = 0  # position within the current segments
+        while i < len(a) and j < len(b):
+            (pattern_a, repeat_a), (pattern_b, repeat_b) = a[i], b[j]
+            span = min(len(pattern_a) * repeat_a - offset_a, len(pattern_b) * repeat_b - offset_b)
+            # patterns have a period of 1 or 2, so two steps are enough to compare the whole span
+            for step in range(min(span, 2)):
+                value_a = pattern_a[(offset_a + step) % len(pattern_a)]
+                value_b = pattern_b[(offset_b + step) % len(pattern_b)]
+                if value_a != value_b:
+                    return -1 if value_a < value_b else 1
+            offset_a += span
+            offset_b += span
+            if offset_a == len(pattern_a) * repeat_a:
+                i, offset_a = i + 1, 0
+            if offset_b == len(pattern_b) * repeat_b:
+                j, offset_b = j + 1, 0
+        return (i < len(a)) - (j < len(b))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (MajorityValues, list)):
+            return NotImplemented
+        return self._compare(other) == 0
+
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, (MajorityValues, list)):
+            return NotImplemented
+        return self._compare(other) < 0
+
+
 @dataclass
 class MajorityValue:
     profile: Dict[Grade, int]
-    values: List[int] = field(default_factory=list)
+    values: MajorityValues = None
     grade: int = 0
 
     def __post_init__(self):
-        if self.values == []:
-            votes = [i for grade, num in self.profile.items() for i in [grade] * num]
-            for _ in range(len(votes)):
-                grade: int = majority_grade_from_votes(votes)
-                self.values.append(grade)
-                votes.remove(grade)
+        if self.values is None or self.values == []:
+            self.values = MajorityValues.from_profile(self.profile)
+        elif not isinstance(self.values, MajorityValues):
+            self.values = MajorityValues.from_list(self.values)
         self.grade = self.values[0]
 
 
-def sort_by_value_with_index(values: List[MajorityValue]) -> List[Tuple[int, MajorityGauge]]:
+def sort_by_value_with_index(values: List[MajorityValue]) -> List[Tuple[int, MajorityValue]]:
     return sorted(enumerate(values), key=lambda x: getattr(x[1], "values"), reverse=True)
@@ -11,7 +11,12 @@ from typing import Dict, List, Union
 import numpy as np
 
 
-def majority_judgment(data: Dict[str, List[Union[int, float]]] = None, reverse: bool = False):
+def majority_judgment(
+    data: Dict[str, List[Union[int, float]]] = None,
+    reverse: bool = False,
+    exact: bool = False,
+    sample_size: int = None,
+):
     """
     apply majority judgment
 
@@ -22,11 +27,18 @@ def majority_judgment(data: Dict[str, List[Union[int, float]]] = None, reverse:
         str correspond to the names of candidates, List of int is the number for each grades
     reverse: bool
         if you want to flip the grades order
+    exact: bool
+        if the ranking is computed with integer tallies instead of floats, see majority_judgment_exact
+    sample_size: int
+        number of voters to convert percentages into tallies in exact mode
     Returns
     -------
         Rank order for each candidates in a Dictionary Dict[str, rank: int]
         best_grades Dict[str, grade: int]
     """
+    if exact:
+        return majority_judgment_exact(data, reverse=reverse, sample_size=sample_size)
+
     if reverse:
         data = {x: l[::-1] for x, l in data.items()}
     snbvot = {round(sum(x), 2) for x in data.values()}
@@ -50,6 +62,124 @@ def majority_judgment(data: Dict[str, List[Union[int, float]]] = None, reverse:
     return ranking, median_grades
 
 
+def majority_judgment_exact(
+    data: Dict[str, List[Union[int, float]]],
+    reverse: bool = False,
+    sample_size: int = None,
+    decimals: int = 2,
+):
+    """
+    apply majority judgment with exact integer arithmetic, vectorized over candidates.
+
+    Percentages are converted into integer tallies, either with the number of voters of the survey
+    or as rationals with a common denominator of 10 ** decimals. As all candidates have the same number of votes n,
+    the "enhanced" grade of fmajorit multiplied by n is an integer and the ranking does not depend on rounding.
+    The median grade is the lower middlemost grade, which handles even numbers of votes.
+
+    Parameters
+    ----------
+    data: Dict[str, List[Union[int, float]]
+        Results of the votes
+        str correspond to the names of candidates, List of int is the number for each grades
+    reverse: bool
+        if you want to flip the grades order
+    sample_size: int
+        number of voters, to convert percentages into tallies
+    decimals: int
+        number of decimals of the percentages, used when sample_size is None
+    Returns
+    -------
+        Rank order for each candidates in a Dictionary Dict[str, rank: int]
+        best_grades Dict[str, grade: int]
+    """
+    candidates = list(data)
+    profiles = np.array([data[c] for c in candidates], dtype=float)
+    if reverse:
+        profiles = profiles[:, ::-1]
+    tallies = to_tallies(profiles, sample_size, decimals)
+
+    if not len(set(tallies.sum(axis=1))) == 1:
+        raise ValueError("note the same number of vote for each candidate")
+
+    median_grades = exact_median_grades(tallies)
+    enhanced_grades = exact_enhanced_grades(tallies, median_grades)
+    # the last candidate comes first in case of tie, as in majority_judgment
+    bests = np.lexsort((-np.arange(len(candidates)), -enhanced_grades))
+    ranking = {candidates[x]: i + 1 for i, x in enumerate(bests)}
+
+    return ranking, {c: int(m) for c, m in zip(candidates, median_grades)}
+
+
+def to_tallies(profiles: np.ndarray, sample_sizes: Union[int, np.ndarray] = None, decimals: int = 2) -> np.ndarray:
+    """
+    Convert merit profiles of percentages into integer tallies
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (..., nb_grades) merit profiles
+    sample_sizes: Union[int, np.ndarray]
+        number of voters of each profile (...), the percentages are scaled to it with the largest remainder method
+        so that each tally sums exactly to the sample size. If None, the percentages are considered as rationals
+        with a denominator of 10 ** decimals.
+    decimals: int
+        number of decimals of the percentages, used when sample_sizes is None
+    Returns
+    -------
+        (..., nb_grades) integer tallies
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    if sample_sizes is None:
+        return np.rint(profiles * 10**decimals).astype(np.int64)
+
+    sample_sizes = np.broadcast_to(np.asarray(sample_sizes, dtype=np.int64), profiles.shape[:-1])
+    totals = profiles.sum(axis=-1, keepdims=True)
+    quotas = np.divide(profiles * sample_sizes[..., None], totals, out=np.zeros_like(profiles), where=totals > 0)
+    tallies = np.floor(quotas).astype(np.int64)
+    missing = np.where(totals[..., 0] > 0, sample_sizes - tallies.sum(axis=-1), 0)
+    # the largest remainders get the missing votes
+    order = np.argsort(tallies - quotas, axis=-1, kind="stable")
+    remainder_ranks = np.empty_like(order)
+    np.put_along_axis(remainder_ranks, order, np.arange(profiles.shape[-1]), axis=-1)
+    return tallies + (remainder_ranks < missing[..., None])
+
+
+def exact_median_grades(tallies: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the lower middlemost grade from integer tallies
+
+    Parameters
+    ----------
+    tallies: np.ndarray
+        (..., nb_grades) number of votes for each grade, from the worst to the best grade
+    Returns
+    -------
+    (...) index of the median grade
+    """
+    cumulative_sum = np.cumsum(tallies, axis=-1)
+    return np.argmax(2 * cumulative_sum >= cumulative_sum[..., -1:], axis=-1)
+
+
+def exact_enhanced_grades(tallies: np.ndarray, median_grades: np.ndarray) -> np.ndarray:
+    """
+    "Enhanced" grade of fmajorit multiplied by the number of votes, in integer arithmetic
+
+    Parameters
+    ----------
+    tallies: np.ndarray
+        (..., nb_grades) number of votes for each grade, from the worst to the best grade
+    median_grades: np.ndarray
+        (...) index of the median grade
+    Returns
+    -------
+    (...) median grade * nbvot + number of sponsors if more sponsors than opponents, else - number of opponents
+    """
+    grades = np.arange(tallies.shape[-1])
+    below = np.where(grades < median_grades[..., None], tallies, 0).sum(axis=-1)
+    above = np.where(grades > median_grades[..., None], tallies, 0).sum(axis=-1)
+    return median_grades * tallies.sum(axis=-1) + np.where(above > below, above, -below)
+
+
 def best_grade(l: List):
     """
     Evaluates the best grades
@@ -0,0 +1,383 @@
+"""
+Vectorized majority judgment over a tensor of merit profiles.
+
+All the merit profiles of all the surveys are packed in a single padded array of shape
+(nb_surveys, nb_candidates, nb_grades), so that the median grades, the "enhanced" grades of Fabre
+(see majority_judgment_2.fmajorit) and the ranks are computed for every survey in a few array operations.
+The other tie-breaking rules of the highest median of Fabre (typical, central and usual judgment) are closed forms
+of the same rates of sponsors and opponents, so they cost the same.
+"""
+from typing import List, Tuple
+
+import numpy as np
+from pandas import DataFrame
+import pandas as pd
+
+from .majority_judgment_2 import to_tallies, exact_median_grades, exact_enhanced_grades
+
+METHODS = ("majority", "typical", "central", "usual")
+
+
+def pack_merit_profiles(
+    df: DataFrame, col_intentions: List[str], reverse: bool = True
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pack the merit profiles of all the surveys of a DataFrame in a padded array
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey
+    col_intentions: List[str]
+        col of intentions to considered (ex: _roll or not), from the best grade to the worst grade
+    reverse: bool
+        if you want to flip the grades order, i.e. index 0 is the worst grade
+
+    Returns
+    -------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles padded with zeros
+    grade_mask: np.ndarray
+        (nb_surveys, nb_grades) True for the grades available in each survey
+    candidate_mask: np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+    survey_idx: np.ndarray
+        (nb_rows,) index of the survey of each row of df
+    candidate_idx: np.ndarray
+        (nb_rows,) index of the candidate of each row of df within its survey
+    """
+    survey_idx, _ = pd.factorize(df["id"])
+    candidate_idx = df.groupby(survey_idx, sort=False).cumcount().to_numpy()
+    nb_surveys = survey_idx.max() + 1 if len(survey_idx) else 0
+    nb_candidates = candidate_idx.max() + 1 if len(candidate_idx) else 0
+    nb_grades_max = len(col_intentions)
+
+    nb_grades = df["nombre_mentions"].to_numpy().astype(int)
+    grades = np.arange(nb_grades_max)
+    row_grade_mask = grades[None, :] < nb_grades[:, None]
+
+    intentions = df[col_intentions].to_numpy(dtype=float)
+    intentions = np.where(row_grade_mask, intentions, 0.0)
+    if reverse:
+        flipped = np.clip(nb_grades[:, None] - 1 - grades[None, :], 0, nb_grades_max - 1)
+        intentions = np.where(row_grade_mask, np.take_along_axis(intentions, flipped, axis=1), 0.0)
+
+    profiles = np.zeros((nb_surveys, nb_candidates, nb_grades_max))
+    profiles[survey_idx, candidate_idx] = intentions
+    candidate_mask = np.zeros((nb_surveys, nb_candidates), dtype=bool)
+    candidate_mask[survey_idx, candidate_idx] = True
+    grade_mask = np.zeros((nb_surveys, nb_grades_max), dtype=bool)
+    grade_mask[survey_idx] = row_grade_mask
+
+    return profiles, grade_mask, candidate_mask, survey_idx, candidate_idx
+
+
+def total_votes(profiles: np.ndarray, candidate_mask: np.ndarray, decimals: int = 2) -> np.ndarray:
+    """
+    Total number of votes of each survey, which has to be the same for each candidate
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles
+    candidate_mask: np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+    decimals: int
+        number of decimals considered to compare the totals of votes
+
+    Returns
+    -------
+    (nb_surveys,) the total number of votes of each survey
+    """
+    totals = np.round(profiles.sum(axis=-1), decimals)
+    first = totals[np.arange(totals.shape[0]), np.argmax(candidate_mask, axis=1)]
+    unbalanced = (candidate_mask & (totals != first[:, None])).any(axis=1)
+    if unbalanced.any():
+        raise ValueError(f"note the same number of vote for each candidate in surveys {np.where(unbalanced)[0]}")
+    return first
+
+
+def median_grades(profiles: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the median grade of each candidate, i.e. the first grade with more than 50% of cumulated votes
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles from the worst grade to the best grade
+    totals: np.ndarray
+        (nb_surveys,) the total number of votes of each survey
+
+    Returns
+    -------
+    (nb_surveys, nb_candidates) the index of the median grade
+    """
+    cumulative_sum = np.cumsum(profiles, axis=-1) / totals[:, None, None]
+    return np.argmax(cumulative_sum > 0.5, axis=-1)
+
+
+def enhanced_grades(
+    profiles: np.ndarray, medians: np.ndarray, totals: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    "Enhanced" grade of Fabre, vectorized version of majority_judgment_2.fmajorit
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles from the worst grade to the best grade
+    medians: np.ndarray
+        (nb_surveys, nb_candidates) the index of the median grade
+    totals: np.ndarray
+        (nb_surveys,) the total number of votes of each survey
+
+    Returns
+    -------
+    m: "enhanced" grade
+    p: rate of sponsors, size at the left
+    q: rate of opponents, size at the right
+    """
+    grades = np.arange(profiles.shape[-1])
+    q = np.where(grades < medians[..., None], profiles, 0.0).sum(axis=-1) / totals[:, None]
+    p = np.where(grades > medians[..., None], profiles, 0.0).sum(axis=-1) / totals[:, None]
+    m = tie_breaking_scores(medians, p, q)
+    return m, p, q
+
+
+def tie_breaking_scores(medians: np.ndarray, p: np.ndarray, q: np.ndarray, method: str = "majority") -> np.ndarray:
+    """
+    Score of each candidate with a tie-breaking rule of the highest median
+    # Fabre, A. (2021). Tie-breaking the highest median: alternatives to the majority judgment.
+
+    Parameters
+    ----------
+    medians: np.ndarray
+        the index of the median grade
+    p: np.ndarray
+        rate of sponsors, i.e. votes above the median grade
+    q: np.ndarray
+        rate of opponents, i.e. votes below the median grade
+    method: str
+        majority: median + p if p > q else median - q, the "enhanced" grade of fmajorit
+        typical: median + p - q
+        central: median + (p - q) / (2 (p + q))
+        usual: median + (p - q) / (2 (1 - p - q))
+
+    Returns
+    -------
+    the score of each candidate, the higher the better
+    """
+    if method == "majority":
+        return medians + np.where(p > q, p, -q)
+    if method == "typical":
+        return medians + p - q
+    if method == "central":
+        return medians + 0.5 * np.divide(p - q, p + q, out=np.zeros(np.shape(p)), where=(p + q) > 0)
+    if method == "usual":
+        # 1 - p - q is the rate of votes of the median grade, never zero
+        return medians + 0.5 * (p - q) / (1 - p - q)
+    raise ValueError(f"Unknown tie-breaking method {method}, use one of {METHODS}")
+
+
+def la_recherche_scores(profiles: np.ndarray, medians: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """
+    Score of the article of 'La recherche' from 2012, vectorized version of majority_judgment_2.scoring.
+    The score goes from 10 to 91 in the case of 7 mentions: 10 points by median grade, a bonus of 2 if more sponsors
+    than opponents, 1 if as many, and the rate of sponsors (bonus of 2) or the rate of non opponents.
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles from the worst grade to the best grade
+    medians: np.ndarray
+        (nb_surveys, nb_candidates) the index of the median grade
+    totals: np.ndarray
+        (nb_surveys,) the total number of votes of each survey
+
+    Returns
+    -------
+    (nb_surveys, nb_candidates) the score of each candidate
+    """
+    # same arithmetic as scoring, to get the same ties between sponsors and opponents
+    percentages = 100 * profiles / totals[:, None, None]
+    grades = np.arange(profiles.shape[-1])
+    opponents = np.where(grades < medians[..., None], percentages, 0.0).sum(axis=-1)
+    sponsors = np.where(grades > medians[..., None], percentages, 0.0).sum(axis=-1)
+    bonus = np.where(opponents == sponsors, 1, np.where(opponents < sponsors, 2, 0))
+    return (medians + 1) * 10 + bonus + np.where(bonus == 2, sponsors, 100 - opponents) / 100
+
+
+def rank(scores: np.ndarray, candidate_mask: np.ndarray) -> np.ndarray:
+    """
+    Rank the candidates of each survey by decreasing score.
+    As in majority_judgment_2.majority_judgment, the last candidate comes first in case of tie.
+
+    Parameters
+    ----------
+    scores: np.ndarray
+        (nb_surveys, nb_candidates) the score of each candidate, the higher the better
+    candidate_mask: np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+
+    Returns
+    -------
+    (nb_surveys, nb_candidates) the rank of each candidate starting from 1
+    """
+    scores = np.where(candidate_mask, scores, -np.inf)
+    positions = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape)
+    order = np.lexsort((-positions, -scores), axis=-1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[-1] + 1)[None, :], axis=-1)
+    return ranks
+
+
+def majority_judgment(
+    profiles: np.ndarray,
+    candidate_mask: np.ndarray,
+    exact: bool = False,
+    sample_sizes: np.ndarray = None,
+    method: str = "majority",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Apply majority judgment on all the surveys at once
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles from the worst grade to the best grade
+    candidate_mask: np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+    exact: bool
+        if the ranking is computed with integer tallies, see majority_judgment_2.majority_judgment_exact
+    sample_sizes: np.ndarray
+        (nb_surveys,) number of voters of each survey to convert percentages into tallies in exact mode
+    method: str
+        tie-breaking rule of the highest median, see tie_breaking_scores
+
+    Returns
+    -------
+        ranks (nb_surveys, nb_candidates) rank of each candidate starting from 1
+        median_grades (nb_surveys, nb_candidates) index of the median grade of each candidate
+    """
+    if exact:
+        if sample_sizes is not None:
+            sample_sizes = np.broadcast_to(np.asarray(sample_sizes)[:, None], candidate_mask.shape)
+        tallies = to_tallies(profiles, sample_sizes)
+        total_votes(tallies, candidate_mask, decimals=0)
+        medians = exact_median_grades(tallies)
+        if method == "majority":
+            return rank(exact_enhanced_grades(tallies, medians), candidate_mask), medians
+        grades = np.arange(tallies.shape[-1])
+        nb_votes = tallies.sum(axis=-1)
+        below = np.where(grades < medians[..., None], tallies, 0).sum(axis=-1)
+        above = np.where(grades > medians[..., None], tallies, 0).sum(axis=-1)
+        if method == "typical":
+            # median * n + above - below, in integer arithmetic
+            return rank(medians * nb_votes + above - below, candidate_mask), medians
+        nb_votes = np.where(nb_votes > 0, nb_votes, 1)
+        return rank(tie_breaking_scores(medians, above / nb_votes, below / nb_votes, method), candidate_mask), medians
+
+    totals = total_votes(profiles, candidate_mask)
+    medians = median_grades(profiles, totals)
+    _, p, q = enhanced_grades(profiles, medians, totals)
+    return rank(tie_breaking_scores(medians, p, q, method), candidate_mask), medians
+
+
+def _jump_intervals(shares: np.ndarray, medians: np.ndarray, upward: np.ndarray, nb_grades: np.ndarray):
+    """
+    Intervals of enhanced grades skipped when the votes of a candidate are moved to the best grade (upward)
+    or to the worst grade. In median grade i, the enhanced grade jumps from i - q to i + p when the rates of sponsors p
+    and opponents q cross, which happens at (p + q) / 2 = (1 - share of the grade i) / 2 from i.
+
+    Parameters
+    ----------
+    shares: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles as shares of votes from the worst grade to the best grade
+    medians: np.ndarray
+        (nb_surveys, nb_candidates) the index of the median grade
+    upward: np.ndarray
+        (nb_surveys, nb_candidates) True if there are more sponsors than opponents
+    nb_grades: np.ndarray
+        (nb_surveys,) number of grades of each survey
+
+    Returns
+    -------
+    lower and upper bounds of the intervals crossed upward, then of the intervals crossed downward,
+    each (nb_surveys, nb_candidates, nb_grades), empty intervals for the grades which are never crossed
+    """
+    grades = np.arange(shares.shape[-1])
+    medians = medians[..., None]
+    upward = upward[..., None]
+    half = (1 - shares) / 2
+    up = (grades >= medians) & (grades <= nb_grades[:, None, None] - 2) & ~((grades == medians) & upward)
+    down = (grades <= medians) & (grades >= 1) & ~((grades == medians) & ~upward)
+    return (
+        np.where(up, grades - half, 0.0),
+        np.where(up, grades + half, 0.0),
+        np.where(down, grades - half, 0.0),
+        np.where(down, grades + half, 0.0),
+    )
+
+
+def _overlap(start: np.ndarray, stop: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Total length of the intersection of [start, stop] with the intervals [lower, upper] of the last axis
+    """
+    return np.clip(np.minimum(stop[..., None], upper) - np.maximum(start[..., None], lower), 0, None).sum(axis=-1)
+
+
+def flip_margins(profiles: np.ndarray, candidate_mask: np.ndarray, grade_mask: np.ndarray) -> np.ndarray:
+    """
+    Minimal share of votes to change so that each pair of candidates swaps in the ranking of majority judgment,
+    the pairwise extension of the number of votes to get the next grade of majority_judgment_2.fmajorit.
+
+    The lower ranked candidate b may gain votes moved from its worst grades to the best grade, and the upper ranked
+    candidate a may lose votes moved from its best grades to the worst grade. Each moved vote shifts the enhanced grade
+    by its share, except when the rates of sponsors and opponents cross, where the enhanced grade jumps for free.
+    So the cost to swap is m_a - m_b minus the jumps of b below a meeting point t, and of a above it,
+    maximized over t, which is one of the ends of the jumps.
+
+    Parameters
+    ----------
+    profiles: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) merit profiles from the worst grade to the best grade
+    candidate_mask: np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+    grade_mask: np.ndarray
+        (nb_surveys, nb_grades) True for the grades available in each survey
+
+    Returns
+    -------
+    (nb_surveys, nb_candidates, nb_candidates) symmetric matrix of the votes to change to swap two candidates,
+    in the unit of the profiles (percentage of the respondents)
+    """
+    totals = total_votes(profiles, candidate_mask)
+    medians = median_grades(profiles, totals)
+    m, p, q = enhanced_grades(profiles, medians, totals)
+    shares = profiles / np.where(totals > 0, totals, 1)[:, None, None]
+    up_lower, up_upper, down_lower, down_upper = _jump_intervals(shares, medians, p > q, grade_mask.sum(axis=1))
+
+    # a = upper candidate (axis 1), b = lower candidate (axis 2), meeting points t (axis 3)
+    m_a = np.broadcast_to(m[:, :, None], m.shape + m.shape[-1:])
+    m_b = np.broadcast_to(m[:, None, :], m_a.shape)
+    meeting_points = np.concatenate(
+        [
+            np.broadcast_to(up_upper[:, None, :, :], m_a.shape + up_upper.shape[-1:]),
+            np.broadcast_to(down_lower[:, :, None, :], m_a.shape + down_lower.shape[-1:]),
+            m_b[..., None],
+        ],
+        axis=-1,
+    )
+    meeting_points = np.clip(meeting_points, m_b[..., None], np.maximum(m_a, m_b)[..., None])
+    up_gain = _overlap(m_b[..., None], meeting_points, up_lower[:, None, :, None, :], up_upper[:, None, :, None, :])
+    down_gain = _overlap(
+        meeting_points, m_a[..., None], down_lower[:, :, None, None, :], down_upper[:, :, None, None, :]
+    )
+    costs = np.clip(m_a - m_b - (up_gain + down_gain).max(axis=-1), 0, None)
+
+    # the cost of the pair is the one of the lower ranked candidate overtaking the upper ranked one
+    ranks = rank(m, candidate_mask)
+    above = ranks[:, :, None] < ranks[:, None, :]
+    margins = np.where(above, costs, np.swapaxes(costs, 1, 2)) * totals[:, None, None]
+    pair_mask = candidate_mask[:, :, None] & candidate_mask[:, None, :]
+    return np.where(pair_mask, margins, 0.0)
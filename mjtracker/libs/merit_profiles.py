@@ -0,0 +1,249 @@
+"""
+Compact container of the merit profiles of a batch of surveys, accepted by every backend of libs.backends.
+
+The votes of all the candidates of all the surveys are held in one contiguous padded array, from the worst grade to the
+best grade, next to the ids of the surveys, the names of the candidates, the labels of the grades and the sample sizes.
+It converts from and to the rows of the survey DataFrame with whole-column reads, without any access cell by cell.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .majority_judgment_batch import pack_merit_profiles
+
+
+class MeritProfiles:
+    """
+    Merit profiles of the candidates of a batch of surveys, padded to the largest survey.
+
+    Attributes
+    ----------
+    profiles : np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) number or percentage of votes, from the worst grade to the best grade
+    grade_mask : np.ndarray
+        (nb_surveys, nb_grades) True for the grades available in each survey
+    candidate_mask : np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+    sample_sizes : np.ndarray
+        (nb_surveys,) number of respondents of each survey (echantillon), None if they are not known
+    surveys : np.ndarray
+        (nb_surveys,) id of each survey
+    candidates : np.ndarray
+        (nb_surveys, nb_candidates) names of the candidates, None for the padding
+    grades : np.ndarray
+        (nb_surveys, nb_grades) labels of the grades, from the worst grade to the best grade, None for the padding
+    """
+
+    __slots__ = ("profiles", "grade_mask", "candidate_mask", "sample_sizes", "surveys", "candidates", "grades")
+
+    def __init__(
+        self,
+        profiles: np.ndarray,
+        grade_mask: np.ndarray = None,
+        candidate_mask: np.ndarray = None,
+        sample_sizes: np.ndarray = None,
+        surveys: Sequence = None,
+        candidates: np.ndarray = None,
+        grades: np.ndarray = None,
+    ):
+        self.profiles = np.ascontiguousarray(profiles, dtype=float)
+        if self.profiles.ndim != 3:
+            raise ValueError(f"profiles of shape {self.profiles.shape} are not (nb_surveys, nb_candidates, nb_grades)")
+        nb_surveys, nb_candidates, nb_grades = self.profiles.shape
+        if grade_mask is None:
+            grade_mask = np.ones((nb_surveys, nb_grades), dtype=bool)
+        if candidate_mask is None:
+            candidate_mask = np.ones((nb_surveys, nb_candidates), dtype=bool)
+        self.grade_mask = np.asarray(grade_mask, dtype=bool)
+        self.candidate_mask = np.asarray(candidate_mask, dtype=bool)
+        self.sample_sizes = None if sample_sizes is None else np.asarray(sample_sizes, dtype=int)
+        self.surveys = np.arange(nb_surveys) if surveys is None else np.asarray(surveys, dtype=object)
+        if candidates is None:
+            candidates = np.broadcast_to(np.arange(nb_candidates), self.candidate_mask.shape)
+        if grades is None:
+            grades = np.broadcast_to(np.arange(nb_grades), self.grade_mask.shape)
+        self.candidates = np.where(self.candidate_mask, np.asarray(candidates, dtype=object), None)
+        self.grades = np.where(self.grade_mask, np.asarray(grades, dtype=object), None)
+
+    @classmethod
+    def from_dataframe(
+        cls, df: DataFrame, col_intentions: List[str], reverse: bool = True, col_sample_size: str = None
+    ) -> Tuple["MeritProfiles", np.ndarray, np.ndarray]:
+        """
+        Merit profiles of all the surveys of a DataFrame, one row per candidate of each survey
+
+        Parameters
+        ----------
+        df: DataFrame
+            contains all the data of vote / survey
+        col_intentions: List[str]
+            col of intentions to considered (ex: _roll or not), from the best grade to the worst grade
+        reverse: bool
+            if the intentions are given from the best grade to the worst grade, so that they are flipped
+        col_sample_size: str
+            col of the number of respondents of each survey (ex: echantillon), not read if None
+        Returns
+        -------
+            the merit profiles of the surveys,
+            survey_idx (nb_rows,) index of the survey of each row of df,
+            candidate_idx (nb_rows,) index of the candidate of each row of df within its survey
+        """
+        profiles, grade_mask, candidate_mask, survey_idx, candidate_idx = pack_merit_profiles(
+            df, col_intentions, reverse=reverse
+        )
+        nb_surveys, nb_grades = grade_mask.shape
+
+        candidates = np.full(candidate_mask.shape, None, dtype=object)
+        candidates[survey_idx, candidate_idx] = df["candidat"].to_numpy()
+
+        # the available labels of the grades of each survey, in the order of col_intentions
+        labels = df[[f"mention_{i}" for i in range(1, 8)]].to_numpy(dtype=object)
+        available = pd.notna(labels) & (labels != "nan")
+        labels = np.take_along_axis(labels, np.argsort(~available, axis=1, kind="stable"), axis=1)[:, :nb_grades]
+        grades = np.full(grade_mask.shape, None, dtype=object)
+        grades[survey_idx] = labels
+        if reverse:
+            nb_survey_grades = grade_mask.sum(axis=1)
+            flipped = np.clip(nb_survey_grades[:, None] - 1 - np.arange(nb_grades)[None, :], 0, nb_grades - 1)
+            grades = np.take_along_axis(grades, flipped, axis=1)
+
+        sample_sizes = None
+        if col_sample_size is not None:
+            sample_sizes = np.zeros(nb_surveys, dtype=int)
+            sample_sizes[survey_idx] = read_sample_sizes(df, col_sample_size)
+
+        surveys = np.empty(nb_surveys, dtype=object)
+        surveys[survey_idx] = df["id"].to_numpy()
+        merit_profiles = cls(profiles, grade_mask, candidate_mask, sample_sizes, surveys, candidates, grades)
+        return merit_profiles, survey_idx, candidate_idx
+
+    @classmethod
+    def from_dict(
+        cls,
+        merit_profiles_dict: Dict[str, Sequence[float]],
+        grades: Sequence[str] = None,
+        sample_size: int = None,
+        reverse: bool = True,
+        survey: str = None,
+    ) -> "MeritProfiles":
+        """
+        Merit profiles of a single survey, from the votes of each candidate
+
+        Parameters
+        ----------
+        merit_profiles_dict: Dict[str, Sequence[float]]
+            number or percentage of votes for each grade of each candidate
+        grades: Sequence[str]
+            labels of the grades, in the same order as the votes
+        sample_size: int
+            number of respondents of the survey
+        reverse: bool
+            if the votes are given from the best grade to the worst grade, so that they are flipped
+        survey: str
+            id of the survey
+        Returns
+        -------
+        The merit profiles of the survey
+        """
+        votes = np.array(list(merit_profiles_dict.values()), dtype=float)
+        grades = np.arange(votes.shape[1]) if grades is None else np.asarray(grades, dtype=object)
+        if reverse:
+            votes, grades = votes[:, ::-1], grades[::-1]
+        return cls(
+            votes[None],
+            sample_sizes=None if sample_size is None else [sample_size],
+            surveys=[0 if survey is None else survey],
+            candidates=np.array(list(merit_profiles_dict), dtype=object)[None],
+            grades=grades[None],
+        )
+
+    def to_dataframe(self, reverse: bool = True, col_intentions: List[str] = None) -> DataFrame:
+        """
+        Rows of the surveys, one per candidate, with the labels of the grades in the cols mention_i
+
+        Parameters
+        ----------
+        reverse: bool
+            if the intentions and the labels are written from the best grade to the worst grade
+        col_intentions: List[str]
+            col of intentions to write (ex: _roll or not), intention_mention_i if None
+        Returns
+        -------
+        The DataFrame of the merit profiles
+        """
+        col_intentions = [f"intention_mention_{i}" for i in range(1, 8)] if col_intentions is None else col_intentions
+        nb_survey_grades = self.grade_mask.sum(axis=1)
+        nb_grades = self.profiles.shape[2]
+        order = np.broadcast_to(np.arange(nb_grades), self.grade_mask.shape)
+        if reverse:
+            order = np.clip(nb_survey_grades[:, None] - 1 - order, 0, nb_grades - 1)
+        survey_idx, candidate_idx = np.nonzero(self.candidate_mask)
+
+        grades = np.where(self.grade_mask, np.take_along_axis(self.grades, order, axis=1), "nan")[survey_idx]
+        votes = self.profiles[survey_idx, candidate_idx]
+        votes = np.where(self.grade_mask[survey_idx], np.take_along_axis(votes, order[survey_idx], axis=1), np.nan)
+
+        df = DataFrame({"id": self.surveys[survey_idx], "candidat": self.candidates[survey_idx, candidate_idx]})
+        df["nombre_mentions"] = nb_survey_grades[survey_idx]
+        if self.sample_sizes is not None:
+            df["echantillon"] = self.sample_sizes[survey_idx]
+        for i in range(7):
+            df[f"mention_{i + 1}"] = grades[:, i] if i < nb_grades else "nan"
+        for i, col in enumerate(col_intentions[:nb_grades]):
+            df[col] = votes[:, i]
+        return df
+
+    def to_dict(self, survey: int = 0, reverse: bool = True) -> Dict[str, List[float]]:
+        """
+        Votes of each candidate of a survey, from the best grade to the worst grade if reverse
+        """
+        nb_grades = self.grade_mask[survey].sum()
+        votes = self.profiles[survey, self.candidate_mask[survey], :nb_grades]
+        votes = votes[:, ::-1] if reverse else votes
+        return dict(zip(self.candidates[survey, self.candidate_mask[survey]].tolist(), votes.tolist()))
+
+    def select(self, surveys: np.ndarray) -> "MeritProfiles":
+        """
+        Merit profiles of some of the surveys, given by their indexes or a boolean mask
+        """
+        return MeritProfiles(
+            self.profiles[surveys],
+            self.grade_mask[surveys],
+            self.candidate_mask[surveys],
+            None if self.sample_sizes is None else self.sample_sizes[surveys],
+            self.surveys[surveys],
+            self.candidates[surveys],
+            self.grades[surveys],
+        )
+
+    def __len__(self):
+        return self.profiles.shape[0]
+
+    def __repr__(self):
+        return "MeritProfiles(surveys={}, candidates={}, grades={})".format(*self.profiles.shape)
+
+
+def read_sample_sizes(df: DataFrame, col_sample_size: str = "echantillon") -> np.ndarray:
+    """
+    Read the number of respondents of each row, for the backends which convert percentages into votes
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey
+    col_sample_size: str
+        col of the number of respondents
+    Returns
+    -------
+    The array (nb_rows,) of the sample sizes
+    """
+    if col_sample_size not in df.columns:
+        raise ValueError(f"The sample size of the surveys is required in the col {col_sample_size}.")
+    # the missing sample sizes are 'nan' strings in the raw surveys and <NA> in the typed surveys
+    sizes = pd.to_numeric(df[col_sample_size].astype(str), errors="coerce").to_numpy(dtype=float)
+    if np.isnan(sizes).any():
+        missing = pd.unique(df["id"].to_numpy()[np.isnan(sizes)]).tolist()
+        raise ValueError(f"The sample size ({col_sample_size}) of the surveys {missing} is missing.")
+    return sizes.astype(int)
@@ -0,0 +1,145 @@
+"""
+Memoization of majority judgment results, keyed by a hash of the merit profiles of a survey and of the options.
+
+The same survey is often ranked several times: for each selection of polling organizations, for rolling and
+non-rolling data, and across the main scripts. Results are kept in a bounded LRU in the current process,
+and optionally in a folder to be shared between runs.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+import hashlib
+
+import numpy as np
+
+from .merit_profiles import MeritProfiles
+
+
+class MajorityJudgmentCache:
+    """
+    Bounded LRU of the ranks and median grades of surveys, with an optional on-disk store.
+
+    Attributes
+    ----------
+    maxsize : int
+        maximum number of surveys kept in memory
+    directory : Path
+        folder of the on-disk store, None to only keep results in memory
+    hits : int
+        number of surveys found in the cache
+    misses : int
+        number of surveys which had to be ranked
+    """
+
+    def __init__(self, maxsize: int = 4096, directory: Path = None):
+        self.maxsize = maxsize
+        self.directory = None if directory is None else Path(directory)
+        if self.directory is not None:
+            self.directory.mkdir(exist_ok=True, parents=True)
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"MajorityJudgmentCache(hits={self.hits}, misses={self.misses}, size={len(self._results)})"
+
+    @staticmethod
+    def key(profile: np.ndarray, options: str = "") -> str:
+        """
+        Canonical hash of a merit profile matrix and of the options of the majority judgment
+
+        Parameters
+        ----------
+        profile: np.ndarray
+            (nb_candidates, nb_grades) merit profile of a survey
+        options: str
+            options of the majority judgment (reverse, official_lib, ...)
+        Returns
+        -------
+        The hexadecimal key
+        """
+        profile = np.ascontiguousarray(profile, dtype=np.float64)
+        header = f"{profile.shape}|{options}".encode()
+        return hashlib.sha1(header + profile.tobytes()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if self.directory is not None and (self.directory / f"{key}.npz").exists():
+            with np.load(self.directory / f"{key}.npz") as data:
+                result = data["ranks"], data["median_grades"]
+            self._remember(key, result)
+            return result
+        return None
+
+    def put(self, key: str, result: Tuple[np.ndarray, np.ndarray]):
+        self._remember(key, result)
+        if self.directory is not None:
+            np.savez(self.directory / f"{key}.npz", ranks=result[0], median_grades=result[1])
+
+    def _remember(self, key: str, result: Tuple[np.ndarray, np.ndarray]):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def rank_surveys(
+        self,
+        merit_profiles: MeritProfiles,
+        rank_function: Callable[[MeritProfiles], Tuple[np.ndarray, np.ndarray]],
+        options: str = "",
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rank the surveys which are not in the cache and fetch the others
+
+        Parameters
+        ----------
+        merit_profiles: MeritProfiles
+            merit profiles of the surveys, their sample sizes are part of the key when they are given
+        rank_function: Callable[[MeritProfiles], Tuple[np.ndarray, np.ndarray]]
+            ranks and median grades (nb_selected_surveys, nb_candidates) of the merit profiles of some surveys,
+            ex: a backend of libs.backends
+        options: str
+            options of the majority judgment
+        Returns
+        -------
+            ranks (nb_surveys, nb_candidates) rank of each candidate starting from 1
+            median_grades (nb_surveys, nb_candidates) index of the median grade of each candidate
+        """
+        profiles, sample_sizes = merit_profiles.profiles, merit_profiles.sample_sizes
+        candidate_mask = merit_profiles.candidate_mask
+        nb_candidates = candidate_mask.sum(axis=1)
+        nb_grades = merit_profiles.grade_mask.sum(axis=1)
+        keys = [
+            self.key(
+                profiles[s, : nb_candidates[s], : nb_grades[s]],
+                options if sample_sizes is None else f"{options}|{sample_sizes[s]}",
+            )
+            for s in range(profiles.shape[0])
+        ]
+
+        ranks = np.zeros(candidate_mask.shape, dtype=int)
+        median_grades = np.zeros(candidate_mask.shape, dtype=int)
+        missing = []
+        for s, key in enumerate(keys):
+            result = self.get(key)
+            if result is None:
+                missing.append(s)
+            else:
+                ranks[s, : nb_candidates[s]], median_grades[s, : nb_candidates[s]] = result
+        self.hits += profiles.shape[0] - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing = np.array(missing)
+            ranks[missing], median_grades[missing] = rank_function(merit_profiles.select(missing))
+            for s in missing:
+                self.put(keys[s], (ranks[s, : nb_candidates[s]].copy(), median_grades[s, : nb_candidates[s]].copy()))
+
+        return ranks, median_grades
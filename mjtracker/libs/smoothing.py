@@ -0,0 +1,157 @@
+"""
+Smoothing of the time series of surveys, shared by load_surveys.rolling_surveys and smp_data.SMPData.
+
+The surveys are first averaged for each day, then each day is smoothed by a kernel over the days around it.
+All the groups (candidates) and all the cols (intentions of each grade) are smoothed at once, on a dense grid of days.
+"""
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+KERNELS = ("flat", "triangular", "exponential")
+
+
+def kernel_weights(
+    window: str = "14d", kernel: str = "flat", center: bool = True, halflife: str = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weights of the days around a day, within the same bounds as the time windows of pandas rolling
+
+    Parameters
+    ----------
+    window: str
+        length of the window
+    kernel: str
+        flat (same weight for each day), triangular (decreasing linearly away from the day)
+        or exponential (halved every halflife away from the day)
+    center: bool
+        if the window is centred on each day, else it ends on each day
+    halflife: str
+        halflife of the exponential kernel, a quarter of the window if None
+    Returns
+    -------
+        offsets (nb_days,) number of days from the smoothed day to each day of the window
+        weights (nb_days,) weight of each day of the window
+    """
+    if kernel not in KERNELS:
+        raise ValueError(f"Unknown kernel {kernel}, available kernels are {KERNELS}")
+    nb_days = pd.Timedelta(window) / pd.Timedelta("1d")
+    if center:
+        # (day - window / 2, day + window / 2]
+        offsets = np.arange(int(np.floor(-nb_days / 2)) + 1, int(np.floor(nb_days / 2)) + 1)
+    else:
+        # (day - window, day]
+        offsets = np.arange(int(np.floor(-nb_days)) + 1, 1)
+
+    distances = np.abs(offsets)
+    if kernel == "flat":
+        weights = np.ones(len(offsets))
+    elif kernel == "triangular":
+        weights = 1 - distances / (distances.max() + 1)
+    else:
+        halflife = nb_days / 4 if halflife is None else pd.Timedelta(halflife) / pd.Timedelta("1d")
+        weights = 0.5 ** (distances / halflife)
+    return offsets, weights
+
+
+def _convolve(values: np.ndarray, offsets: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Weighted sum of the values of the days around each day, along the axis 1 of values (nb_groups, nb_days, ...)
+    """
+    nb_days = values.shape[1]
+    out = np.zeros_like(values)
+    for offset, weight in zip(offsets, weights):
+        start, end = max(0, -offset), min(nb_days, nb_days - offset)
+        if start < end:
+            out[:, start:end] += weight * values[:, start + offset : end + offset]
+    return out
+
+
+def smooth_surveys(
+    df: DataFrame,
+    cols: List[str],
+    by: str = "candidat",
+    window: str = "14d",
+    kernel: str = "flat",
+    center: bool = True,
+    weights: str = None,
+    halflife: str = None,
+    date_col: str = "fin_enquete",
+) -> Tuple[DataFrame, DataFrame]:
+    """
+    Smoothed mean and std of cols for each group and each day with surveys
+
+    With the flat kernel and without weights, it matches df.groupby(by).rolling(window) on the means of each day.
+    The std are weighted with reliability weights, the sample std when all the weights are equal. Missing values
+    are ignored, as in pandas.
+
+    Parameters
+    ----------
+    df: DataFrame
+        dataframe of the surveys
+    cols: List[str]
+        cols to smooth
+    by: str
+        col of the groups smoothed independently, ex: the candidates
+    window: str
+        length of the window
+    kernel: str
+        flat, triangular or exponential, see kernel_weights
+    center: bool
+        if the window is centred on each day, else it ends on each day
+    weights: str
+        col of the weight of each survey, ex: its sample size (echantillon), each day has the same weight if None
+    halflife: str
+        halflife of the exponential kernel
+    date_col: str
+        col of the date of each survey
+    Returns
+    -------
+        the DataFrames of the smoothed mean and std of cols, indexed by the group and the day (date)
+    """
+    offsets, kernel_w = kernel_weights(window, kernel, center, halflife)
+
+    group_idx, groups = pd.factorize(df[by], sort=True)
+    dates = pd.to_datetime(df[date_col]).to_numpy().astype("datetime64[D]")
+    first_date = dates.min()
+    day_idx = (dates - first_date).astype(int)
+    shape = (len(groups), day_idx.max() + 1, len(cols))
+
+    # mean of each day, weighted by the weights of its surveys
+    values = df[cols].to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+    if weights is None:
+        row_weights = np.ones(len(df))
+    else:
+        row_weights = pd.to_numeric(df[weights], errors="coerce").to_numpy(dtype=float)
+        if np.isnan(row_weights).any():
+            raise ValueError(f"the weights {weights} are missing for some surveys")
+    row_weights = np.where(observed, row_weights[:, None], 0.0)
+    sum_weights = np.zeros(shape)
+    sum_values = np.zeros(shape)
+    np.add.at(sum_weights, (group_idx, day_idx), row_weights)
+    np.add.at(sum_values, (group_idx, day_idx), np.where(observed, values, 0.0) * row_weights)
+    daily = np.divide(sum_values, sum_weights, out=np.zeros(shape), where=sum_weights > 0)
+    # each day with surveys counts once without weights, as the mean of resample("1d")
+    day_weights = sum_weights if weights is not None else (sum_weights > 0).astype(float)
+
+    v1 = _convolve(day_weights, offsets, kernel_w)
+    v2 = _convolve(day_weights**2, offsets, kernel_w**2)
+    m1 = _convolve(day_weights * daily, offsets, kernel_w)
+    m2 = _convolve(day_weights * daily**2, offsets, kernel_w)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(v1 > 0, m1 / v1, np.nan)
+        denominator = v1 - v2 / v1
+        var = np.maximum(m2 - m1 * mean, 0) / denominator
+        std = np.where((v1 > 0) & (denominator > 1e-12 * v1), np.sqrt(var), np.nan)
+
+    # back to the days with surveys
+    days = np.unique(np.stack([group_idx, day_idx], axis=1), axis=0)
+    index = pd.MultiIndex.from_arrays(
+        [groups[days[:, 0]], pd.DatetimeIndex(first_date + days[:, 1], name="date")], names=[by, "date"]
+    )
+    df_mean = DataFrame(mean[days[:, 0], days[:, 1]], index=index, columns=cols)
+    df_std = DataFrame(std[days[:, 0], days[:, 1]], index=index, columns=cols)
+    return df_mean, df_std
@@ -6,136 +6,351 @@ Created on Mon Feb 21 15:10:01 2022
 @author: sballe
 """
 from pathlib import Path
+from typing import List
+import hashlib
 import pandas as pd
 from pandas import DataFrame
 import numpy as np
 
-from utils import get_list_survey, get_intentions_colheaders
+from utils import get_intentions_colheaders, get_survey_table
+from libs.smoothing import smooth_surveys
 from misc.enums import Candidacy, AggregationMode, PollingOrganizations, UntilRound
 
 
-def remove_undecided(df_survey: DataFrame, df_undecided_grades: DataFrame):
+def remove_undecided(df_surveys: DataFrame, df_undecided_grades: DataFrame):
     """
-    Remove the undecided grades and affect it proportionally to the other grades
+    Remove the undecided grades and affect it proportionally to the other grades, for all the surveys at once
 
     Parameters
     ----------
-    df_survey: DataFrame
-        dataframe of the survey
+    df_surveys: DataFrame
+        dataframe of one or several surveys
     df_undecided_grades: DataFrame
         corresponding grade which value no opinion
     Returns
     -------
-        return the DataFrame df with the survey with reaffected no opinion to the other grades
+        return the DataFrame df with the surveys with reaffected no opinion to the other grades,
+        and the no opinion in the col sans_opinion (NaN for surveys without undecided grades)
     """
+    cols_grades = [f"mention_{i + 1}" for i in range(7)]
+    cols_intentions = [f"intention_mention_{i + 1}" for i in range(7)]
+    nb_grades = df_surveys["nombre_mentions"].to_numpy().astype(int)
+    in_survey = np.arange(7)[None, :] < nb_grades[:, None]
+    intentions = np.where(in_survey, df_surveys[cols_intentions].to_numpy(dtype=float), 0.0)
+
     # compute initial number of grades attributed to each candidates
-    cols = [f"intention_mention_{i + 1}" for i in range(int(df_survey["nombre_mentions"].iloc[0]))]
-    tot = df_survey[cols].sum(axis=1).round(5).unique()
-    if len(tot) != 1:
-        id_survey = df_survey["id"][df_survey.first_valid_index()]
+    tot = intentions.sum(axis=1).round(5)
+    nb_totals = pd.Series(tot, index=df_surveys.index).groupby(df_surveys["id"], sort=False, observed=True).nunique()
+    if (nb_totals != 1).any():
+        id_survey = nb_totals.index[nb_totals != 1][0]
         raise ValueError(f"the number of grades is not equal for each candidate in {id_survey}")
 
-    tot = tot[0]
-
-    # find the undecided grade
-    cols_grades = [f"mention_{i + 1}" for i in range(df_survey["nombre_mentions"].iloc[0])]
-    the_undecided_grades = []
-    the_undecided_grade_nums = []
-    for undecided_grade in df_undecided_grades["mention"]:
-        bool_with_undecided = df_survey[cols_grades].iloc[0, :].str.contains(undecided_grade)
-        if bool_with_undecided.any():
-            the_undecided_grades.append(bool_with_undecided[bool_with_undecided].index)
-            the_undecided_grade_nums.append(np.where(bool_with_undecided)[0][0])
+    # find the undecided grades
+    undecided = in_survey & np.isin(df_surveys[cols_grades].to_numpy(), df_undecided_grades["mention"].to_numpy())
+    decided = in_survey & ~undecided
+    with_undecided = undecided.any(axis=1)
+    if not with_undecided.any():
+        return df_surveys
 
     # remove the undecided grades
-    if the_undecided_grade_nums:
-        for ii in the_undecided_grades:
-            df_survey.loc[df_survey.index, ii] = "nan"
+    tot_undecided = np.where(undecided, intentions, 0.0).sum(axis=1)
+    tot_decided = np.where(decided, intentions, 0.0).sum(axis=1)
+    factor = 1 + np.divide(tot_undecided, tot_decided, out=np.zeros_like(tot), where=tot_decided != 0)
+    intentions = np.where(decided, intentions * factor[:, None], np.where(undecided, 0.0, intentions))
 
-        index_no = df_survey.columns.get_loc("nombre_mentions")
-        df_survey.loc[df_survey.index, "nombre_mentions"] = int(df_survey.iloc[0, index_no] - len(the_undecided_grades))
+    rows = with_undecided
+    df_surveys.loc[rows, cols_grades] = np.where(undecided, "nan", df_surveys[cols_grades].to_numpy())[rows]
+    df_surveys.loc[rows, cols_intentions] = np.where(in_survey, intentions, df_surveys[cols_intentions])[rows]
+    df_surveys.loc[rows, "nombre_mentions"] = nb_grades[rows] - undecided.sum(axis=1)[rows]
+    # the no opinion col to zero and store it somwehere else
+    df_surveys.loc[rows, "sans_opinion"] = tot_undecided[rows]
 
-        cols_grades_undecided = [f"intention_mention_{i + 1}" for i in the_undecided_grade_nums]
-        cols_grades_decided = [
-            f"intention_mention_{i + 1}"
-            for i in range(df_survey["nombre_mentions"].iloc[0])
-            if f"intention_mention_{i + 1}" not in cols_grades_undecided
-        ]
+    if np.round(np.where(decided, intentions, 0.0).sum(axis=1) - tot, 10)[rows].any():
+        raise ValueError("Something went wrong when reaffecting undecided grades.")
 
-        tot_undecided = df_survey[cols_grades_undecided].sum(axis=1)
-        tot_decided = df_survey[cols_grades_decided].sum(axis=1)
+    return df_surveys
 
-        for col_grade_decided in cols_grades_decided:
-            index_no = df_survey.columns.get_loc(col_grade_decided)
-            df_survey.iloc[:, index_no] = df_survey.iloc[:, index_no] * (1 + tot_undecided / tot_decided)
 
-        # the no opinion col to zero and store it somwehere else
-        df_survey["sans_opinion"] = df_survey[cols_grades_undecided].sum(axis=1)
-        df_survey[cols_grades_undecided] = 0
+def grade_mapping(df_corresponding_grades: DataFrame, aggregation: AggregationMode, no_opinion_mode: bool):
+    """
+    Compile the standardisation of the grades into a mapping matrix
 
-        if np.round(df_survey[cols_grades_decided].sum(axis=1) - tot, 10).any() != 0:
-            raise ValueError("Something went wrong when reaffecting undecided grades.")
+    Parameters
+    ----------
+    df_corresponding_grades: DataFrame
+        corresponding grade (ex: Excellent and good to very positive), one col for each aggregation
+    aggregation: AggregationMode
+        how to manage Aggregation of several grades, the value is the col of df_corresponding_grades
+    no_opinion_mode: bool
+        remove or not the undecided grades
+    Returns
+    -------
+        labels: the labels of the grades of the surveys
+        new_grades: the labels of the aggregated grades, from the best grade to the worst grade
+        mapping: (nb_labels + 1, nb_new_grades) 1 if the grade is aggregated into the new grade,
+        the last row is for the labels which are not standardised
+    """
+    col = aggregation.value
+    if col not in df_corresponding_grades.columns:
+        raise ValueError(f"This method {aggregation} has no col {col} in the standardisation of the grades")
+    # remove no opinion of the aggregate if already removed
+    if no_opinion_mode:
+        df_corresponding_grades = df_corresponding_grades[df_corresponding_grades[col] != "sans opinion"]
 
-    return df_survey
+    labels = df_corresponding_grades["mention"].to_numpy()
+    new_grade_idx, new_grades = pd.factorize(df_corresponding_grades[col])
+    mapping = np.zeros((len(labels) + 1, len(new_grades)))
+    mapping[np.arange(len(labels)), new_grade_idx] = 1
+    return labels, new_grades.to_numpy(), mapping
 
 
 def convert_grades(
-    df_survey: DataFrame, df_corresponding_grades: DataFrame, aggregation: AggregationMode, no_opinion_mode: bool
+    df_surveys: DataFrame, df_corresponding_grades: DataFrame, aggregation: AggregationMode, no_opinion_mode: bool
 ):
     """
-    Remove the undecided grades and affect it proportionally to the other grades
+    Aggregate the grades of all the surveys into the grades of the aggregation, with one matrix product per grade scheme
 
     Parameters
     ----------
-    df_survey: DataFrame
-        dataframe of the survey
+    df_surveys: DataFrame
+        dataframe of one or several surveys
     df_corresponding_grades: DataFrame
         corresponding grade (ex: Excellent and good to very positive)
     aggregation: AggregationMode
-        how to manage Aggregation of several grades
+        how to manage Aggregation of several grades, any col of df_corresponding_grades
     no_opinion_mode: bool
         remove or not the undecided grades
     Returns
     -------
-        return the DataFrame df with the survey with affected new grades and new intentions
+        return the DataFrame df with the surveys with affected new grades and new intentions
     """
-    # remove no opinion of the aggregate if already removed
-    col = aggregation.value
-    if no_opinion_mode:
-        df_corresponding_grades = df_corresponding_grades[df_corresponding_grades[col] != "sans opinion"]
+    labels, new_grades, mapping = grade_mapping(df_corresponding_grades, aggregation, no_opinion_mode)
+    nb_new_grades = len(new_grades)
 
-    # grades of the current survey
-    cols_grades = [f"mention_{i + 1}" for i in range(df_survey["nombre_mentions"].iloc[0])]
-    cols_grades_idx = [df_survey.columns.get_loc(c) for c in cols_grades]
+    cols_grades = [f"mention_{i + 1}" for i in range(7)]
+    cols_intentions = [f"intention_mention_{i + 1}" for i in range(7)]
+    nb_grades = df_surveys["nombre_mentions"].to_numpy().astype(int)
+    in_survey = np.arange(7)[None, :] < nb_grades[:, None]
 
-    cols_intentions = [f"intention_mention_{i + 1}" for i in range(df_survey["nombre_mentions"].iloc[0])]
-    cols_intentions_idx = [df_survey.columns.get_loc(c) for c in cols_intentions]
-    grades_survey = df_survey[cols_grades].loc[df_survey.first_valid_index()]
+    # one mapping matrix (7, nb_new_grades) for each grade scheme of the surveys
+    grades = df_surveys[cols_grades].to_numpy()
+    scheme_idx, schemes = pd.factorize(pd.Series(map(tuple, np.where(in_survey, grades, "nan"))))
+    scheme_labels = np.array(list(schemes), dtype=object).reshape(len(schemes), 7)
+    label_idx = pd.Index(labels).get_indexer(scheme_labels.ravel()).reshape(scheme_labels.shape)
+    scheme_mappings = mapping[label_idx]
 
-    # loop over the objectives new grades to replace the older ones
-    new_grades = df_corresponding_grades[col].unique()
+    intentions = np.where(in_survey, df_surveys[cols_intentions].to_numpy(dtype=float), 0.0)
+    new_intentions = np.matmul(intentions[:, None, :], scheme_mappings[scheme_idx])[:, 0, :]
 
     # Refill the new_survey dataframe
-    new_df_survey = df_survey.copy()
-    new_df_survey.iloc[:, cols_intentions_idx] = 0
-    new_df_survey.iloc[:, cols_grades_idx] = "nan"
-    if aggregation == AggregationMode.FOUR_MENTIONS:
-        new_df_survey.loc[new_df_survey.index, "nombre_mentions"] = 4
-    else:
-        raise NotImplementedError(f"This method {aggregation} is not implemented ")
-
-    # Add the numbers together
-    for i, ng in enumerate(new_grades):
-        new_df_survey.iloc[:, cols_grades_idx[i]] = ng
-        potential_grades = df_corresponding_grades[df_corresponding_grades[col] == ng]["mention"]
-        # find if al the potential grades are in this survey
-        for pg in potential_grades:
-            pg_in_grades_survey = pg == grades_survey
-            if pg_in_grades_survey.any():
-                idx = np.where(pg_in_grades_survey)[0][0]
-                new_df_survey.iloc[:, cols_intentions_idx[i]] += df_survey.iloc[:, cols_intentions_idx[idx]]
-
-    return new_df_survey
+    new_df_surveys = df_surveys.copy()
+    old_intentions = df_surveys[cols_intentions].to_numpy()
+    new_df_surveys[cols_intentions] = np.hstack(
+        [new_intentions, np.where(in_survey, 0, old_intentions)[:, nb_new_grades:]]
+    ).astype(float)
+    new_df_surveys[cols_grades] = np.hstack([new_grades, ["nan"] * (7 - nb_new_grades)])
+    new_df_surveys["nombre_mentions"] = nb_new_grades
+
+    return new_df_surveys
+
+
+LABEL_COLS = ["candidat", "parti", "id", "nom_institut", "commanditaire", "population", "hypothese"] + [
+    f"mention_{i}" for i in range(1, 8)
+]
+DATE_COLS = ["debut_enquete", "fin_enquete", "retrait_candidature"]
+
+
+def to_typed_surveys(df: DataFrame) -> DataFrame:
+    """
+    Narrow the dtypes of a DataFrame of surveys: categoricals for the labels, dates, small integers and
+    missing values as NA instead of the string "nan". The intentions stay float64, so that the ranks do not change.
+
+    Parameters
+    ----------
+    df: DataFrame
+        dataframe of the surveys, raw or as normalized by load_surveys
+    Returns
+    -------
+    The typed DataFrame, the filters on the labels run on the integer codes of the categoricals.
+    """
+    df = df.copy()
+    for col in LABEL_COLS:
+        if col in df.columns:
+            df[col] = df[col].replace("nan", np.nan).astype("category")
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col].replace("nan", None))
+    df["nombre_mentions"] = df["nombre_mentions"].astype(np.int8)
+    if "echantillon" in df.columns:
+        df["echantillon"] = pd.to_numeric(df["echantillon"].replace("nan", None)).astype("Int32")
+    return df
+
+
+def memory_report(df: DataFrame) -> DataFrame:
+    """
+    Memory used by each col of a DataFrame
+
+    Parameters
+    ----------
+    df: DataFrame
+        any dataframe
+    Returns
+    -------
+    The DataFrame of the dtype and of the memory in kB of each col, from the largest col, with the total
+    """
+    memory = df.memory_usage(deep=True, index=False) / 1e3
+    report = DataFrame({"dtype": df.dtypes.astype(str), "memory_kB": memory}).sort_values("memory_kB", ascending=False)
+    report.loc["total"] = ["", memory.sum()]
+    return report
+
+
+def surveys_cache_key(csv_file: Path, standardisation_file: Path, **options) -> str:
+    """
+    Key of the normalized surveys in the cache of load_surveys
+
+    Parameters
+    ----------
+    csv_file: Path
+        Path of the  file which contains all the data of vote / survey
+    standardisation_file: Path
+        Path of the file of the corresponding grades
+    options:
+        arguments of load_surveys
+    Returns
+    -------
+    The hash of the content of both files, of the arguments and of the normalization and smoothing code
+    """
+    code_dir = Path(__file__).parent
+    key = hashlib.sha1()
+    for file in (csv_file, standardisation_file, __file__, code_dir / "libs" / "smoothing.py", code_dir / "utils.py"):
+        key.update(Path(file).read_bytes())
+    for name, value in sorted(options.items()):
+        key.update(f"{name}={value.value if hasattr(value, 'value') else value};".encode())
+    return key.hexdigest()
+
+
+def select_surveys(
+    df_surveys: DataFrame,
+    candidates: Candidacy = Candidacy.ALL,
+    polling_organization: PollingOrganizations = PollingOrganizations.ALL,
+    start_date: str = None,
+    end_date: str = None,
+    candidate_names: List[str] = None,
+) -> np.ndarray:
+    """
+    Select the rows of the surveys to load, as a boolean mask computed once on the raw file
+
+    Parameters
+    ----------
+    df_surveys: DataFrame
+        contains all the data of vote / survey
+    candidates: Candidacy
+        how to manage candidacies
+    polling_organization: PollingOrganizations
+        select polling organization
+    start_date: str
+        keep the surveys ending from this date (included)
+    end_date: str
+        keep the surveys ending before this date (excluded)
+    candidate_names: List[str]
+        keep only these candidates
+    Returns
+    -------
+    The boolean mask of the rows to keep
+    """
+    mask = np.ones(len(df_surveys), dtype=bool)
+    if polling_organization != PollingOrganizations.ALL:
+        mask &= df_surveys["nom_institut"].to_numpy() == polling_organization.value
+
+    if candidates in (
+        Candidacy.ALL_CANDIDATES_FROM_BEGINNING,
+        Candidacy.ALL_CURRENT_CANDIDATES,
+        Candidacy.ALL_CURRENT_CANDIDATES_WITH_ENOUGH_DATA,
+    ):
+        mask &= (df_surveys["candidat_presidentielle"] == True).to_numpy()
+    if candidates in (Candidacy.ALL_CURRENT_CANDIDATES, Candidacy.ALL_CURRENT_CANDIDATES_WITH_ENOUGH_DATA):
+        mask &= df_surveys["retrait_candidature"].isna().to_numpy() | (df_surveys["retrait_candidature"] == "nan")
+    if candidates == Candidacy.ALL_CURRENT_CANDIDATES_WITH_ENOUGH_DATA:
+        # todo: dont hard code, remove candidates with only two dots instead.
+        mask &= ~df_surveys["candidat"].isin(["Nathalie Arthaud", "Jean Lassalle"]).to_numpy()
+    if candidates == Candidacy.SECOND_ROUND:
+        mask &= (df_surveys["second_tour"] == True).to_numpy()
+
+    if start_date is not None:
+        mask &= (df_surveys["fin_enquete"] >= start_date).to_numpy()
+    if end_date is not None:
+        mask &= (df_surveys["fin_enquete"] < end_date).to_numpy()
+    if candidate_names is not None:
+        mask &= df_surveys["candidat"].isin(candidate_names).to_numpy()
+
+    return mask
+
+
+def normalize_surveys(
+    df_surveys: DataFrame,
+    df_standardisation: DataFrame,
+    no_opinion_mode: bool = True,
+    candidates: Candidacy = Candidacy.ALL,
+    aggregation: AggregationMode = AggregationMode.NO_AGGREGATION,
+    polling_organization: PollingOrganizations = PollingOrganizations.ALL,
+    start_date: str = None,
+    end_date: str = None,
+    candidate_names: List[str] = None,
+) -> DataFrame:
+    """
+    Select and normalize the rows of raw surveys, read with na_filter=False. Each survey is processed on its own,
+    so any set of whole surveys can be normalized independently of the others (see stream_surveys).
+
+    Parameters
+    ----------
+    df_surveys: DataFrame
+        raw rows of one or several whole surveys
+    df_standardisation: DataFrame
+        table of standardisation of the grades
+    no_opinion_mode: bool
+        remove or not the undecided grades
+    candidates: Candidacy
+        how to manage candidacies
+    aggregation: AggregationMode
+        how to manage Aggregation of several grades
+    polling_organization: PollingOrganizations
+        select polling organization
+    start_date: str
+        keep the surveys ending from this date (included)
+    end_date: str
+        keep the surveys ending before this date (excluded)
+    candidate_names: List[str]
+        keep only these candidates
+    Returns
+    -------
+    The DataFrame of the selected and normalized surveys
+    """
+    for i in range(7):
+        df_surveys[f"intention_mention_{i+1}"] = pd.to_numeric(df_surveys[f"intention_mention_{i+1}"])
+    # convert mention number to integer
+    df_surveys["nombre_mentions"] = pd.to_numeric(df_surveys["nombre_mentions"])
+
+    # filter the rows before any processing of the surveys, on the integer codes of the labels of a typed frame
+    rows = select_surveys(df_surveys, candidates, polling_organization, start_date, end_date, candidate_names)
+    df_surveys = df_surveys[rows].copy()
+    cols_categories = [col for col in df_surveys.columns if isinstance(df_surveys[col].dtype, pd.CategoricalDtype)]
+    for col in cols_categories:
+        df_surveys[col] = df_surveys[col].cat.remove_unused_categories()
+    # the grades are rewritten, they are typed again by to_typed_surveys
+    cols_grades = [f"mention_{i + 1}" for i in range(7)]
+    df_surveys[cols_grades] = df_surveys[cols_grades].astype(object)
+
+    # remove undecided
+    if no_opinion_mode:
+        df_surveys["sans_opinion"] = np.nan
+
+        df_undecided_grades = df_standardisation[df_standardisation["to_4_mentions"] == "sans opinion"]
+        df_surveys = remove_undecided(df_surveys, df_undecided_grades)
+
+    if aggregation != AggregationMode.NO_AGGREGATION:
+        df_surveys = convert_grades(df_surveys, df_standardisation, aggregation, no_opinion_mode)
+
+    return df_surveys
 
 
 def load_surveys(
@@ -146,6 +361,16 @@ def load_surveys(
     polling_organization: PollingOrganizations = None,
     until_round: UntilRound = None,
     rolling_data: bool = False,
+    cache_dir: Path = None,
+    start_date: str = None,
+    end_date: str = None,
+    candidate_names: List[str] = None,
+    rolling_window: str = "14d",
+    rolling_center: bool = True,
+    typed: bool = False,
+    with_survey_table: bool = False,
+    rolling_kernel: str = "flat",
+    rolling_weighted: bool = False,
 ):
     """
     normalize file
@@ -163,12 +388,34 @@ def load_surveys(
     polling_organization: PollingOrganizations
         select polling organization
     until_round: UntilRound
-        select until which round we wante to load the data
+        select until which round we wante to load the data, ignored if end_date is given
     rolling_data: bool
-        if rolling grade intentions over 14d to smooth the data
+        if rolling grade intentions over rolling_window to smooth the data
+    cache_dir: Path
+        folder where the normalized surveys are stored, loaded from it when the files and the arguments are unchanged.
+        Stored as pickles, which keep the dtypes of the mixed string and numeric cols of the surveys.
+    start_date: str
+        keep the surveys ending from this date (included), ex: "2022-01-01"
+    end_date: str
+        keep the surveys ending before this date (excluded), the date of until_round if None
+    candidate_names: List[str]
+        keep only these candidates, on top of the selection of candidates
+    rolling_window: str
+        length of the rolling window of rolling_data
+    rolling_center: bool
+        if the rolling window is centred on each date
+    typed: bool
+        if the labels are categoricals and the dates datetimes, from the raw file so that the surveys are selected
+        on the integer codes of the labels, see to_typed_surveys
+    with_survey_table: bool
+        if the table of the surveys, one row per survey with its grades, is returned too (see utils.get_survey_table)
+    rolling_kernel: str
+        weights of the days of the rolling window, flat, triangular or exponential (see libs.smoothing)
+    rolling_weighted: bool
+        if the rolling intentions are weighted by the sample size (echantillon) of the surveys
     Returns
     -------
-    Return the DataFrame df with all surveys inside
+    Return the DataFrame df with all surveys inside, and the table of the surveys if with_survey_table
     """
     if candidates is None:
         candidates = Candidacy.ALL
@@ -176,79 +423,118 @@ def load_surveys(
         aggregation = AggregationMode.NO_AGGREGATION
     if polling_organization is None:
         polling_organization = PollingOrganizations.ALL
-
-    df_surveys = pd.read_csv(csv_file, na_filter=False)
-    for i in range(7):
-        df_surveys[f"intention_mention_{i+1}"] = pd.to_numeric(df_surveys[f"intention_mention_{i+1}"])
-    # convert mention number to integer
-    df_surveys["nombre_mentions"] = pd.to_numeric(df_surveys["nombre_mentions"])
-
-    df_standardisation = pd.read_csv("../standardisation.csv", na_filter=False)
-
-    if polling_organization != PollingOrganizations.ALL:
-        df_surveys = df_surveys[df_surveys["nom_institut"] == polling_organization.value]
-
-    # remove undecided
-    if no_opinion_mode:
-        df_surveys["sans_opinion"] = np.nan
-
-        df_undecided_grades = df_standardisation[df_standardisation["to_4_mentions"] == "sans opinion"]
-        surveys = get_list_survey(df_surveys)
-
-        for survey in surveys:
-            print(survey)
-            # select the survey
-            df_survey = df_surveys[df_surveys["id"] == survey].copy()
-            # remove undecided grades
-            df_survey = remove_undecided(df_survey, df_undecided_grades)
-
-            # refill the dataframe of surveys
-            df_surveys[df_surveys["id"] == survey] = df_survey
-
-    if candidates == Candidacy.ALL_CANDIDATES_FROM_BEGINNING:
-        df_surveys = df_surveys[df_surveys["candidat_presidentielle"] == True]
-
-    if candidates == Candidacy.ALL_CURRENT_CANDIDATES:
-        df_surveys = df_surveys[df_surveys["candidat_presidentielle"] == True]
-        df_surveys = df_surveys[df_surveys["retrait_candidature"] == "nan"]
-
-    if candidates == Candidacy.ALL_CURRENT_CANDIDATES_WITH_ENOUGH_DATA:
-        df_surveys = df_surveys[df_surveys["candidat_presidentielle"] == True]
-        df_surveys = df_surveys[df_surveys["retrait_candidature"] == "nan"]
-        df_surveys = df_surveys[df_surveys["candidat"] != "Nathalie Arthaud"]  # todo: dont hard code
-        df_surveys = df_surveys[
-            df_surveys["candidat"] != "Jean Lassalle"
-        ]  # todo: remove candidates with only two dots instead.
-
-    if candidates == Candidacy.SECOND_ROUND:
-        df_surveys = df_surveys[df_surveys["second_tour"] == True]
-
     if until_round is None:
         until_round = UntilRound.SECOND
-    df_surveys = df_surveys[df_surveys["fin_enquete"] < until_round.value]
+    if end_date is None:
+        end_date = until_round.value
+    standardisation_file = Path("../standardisation.csv")
+
+    if cache_dir is not None:
+        key = surveys_cache_key(
+            csv_file,
+            standardisation_file,
+            no_opinion_mode=no_opinion_mode,
+            candidates=candidates,
+            aggregation=aggregation,
+            polling_organization=polling_organization,
+            rolling_data=rolling_data,
+            start_date=start_date,
+            end_date=end_date,
+            candidate_names=candidate_names,
+            rolling_window=rolling_window,
+            rolling_center=rolling_center,
+            typed=typed,
+            rolling_kernel=rolling_kernel,
+            rolling_weighted=rolling_weighted,
+        )
+        cache_file = Path(cache_dir) / f"surveys_{key}.pkl"
+        if cache_file.exists():
+            df_surveys = pd.read_pickle(cache_file)
+            return (df_surveys, get_survey_table(df_surveys)) if with_survey_table else df_surveys
 
-    if aggregation != AggregationMode.NO_AGGREGATION:
+    df_surveys = pd.read_csv(csv_file, na_filter=False)
+    if typed:
+        df_surveys = to_typed_surveys(df_surveys)
+    df_standardisation = pd.read_csv(standardisation_file, na_filter=False)
+    df_surveys = normalize_surveys(
+        df_surveys,
+        df_standardisation,
+        no_opinion_mode,
+        candidates,
+        aggregation,
+        polling_organization,
+        start_date,
+        end_date,
+        candidate_names,
+    )
+
+    if rolling_data:
+        df_surveys = rolling_surveys(
+            df_surveys, no_opinion_mode, rolling_window, rolling_center, rolling_kernel, rolling_weighted
+        )
 
-        surveys = get_list_survey(df_surveys)
+    if typed:
+        # the cols written by the normalization are typed again
+        df_surveys = to_typed_surveys(df_surveys)
 
-        for survey in surveys:
-            print(survey)
-            # select the survey
-            df_survey = df_surveys[df_surveys["id"] == survey].copy()
-            # remove undecided grades
-            df_survey = convert_grades(df_survey, df_standardisation, aggregation, no_opinion_mode)
-            # refill the dataframe of surveys
-            df_surveys[df_surveys["id"] == survey] = df_survey
+    if cache_dir is not None:
+        cache_file.parent.mkdir(exist_ok=True, parents=True)
+        df_surveys.to_pickle(cache_file)
 
-    if rolling_data:
-        df_surveys = rolling_surveys(df_surveys, no_opinion_mode)
+    return (df_surveys, get_survey_table(df_surveys)) if with_survey_table else df_surveys
 
-    return df_surveys
 
+def load_segmented_surveys(
+    csv_files: List[Path],
+    segments: List[str] = None,
+    col_segment: str = "segment",
+    **kwargs,
+) -> DataFrame:
+    """
+    Load and normalize several files of surveys, ex: the second round surveys of the voters of each candidate,
+    in a single DataFrame whose rows are tagged with the segment of their file
 
-def rolling_surveys(df: DataFrame, no_opinion_mode: bool = True):
+    Parameters
+    ----------
+    csv_files: List[Path]
+        Paths of the files which contain the data of vote / survey of each segment
+    segments: List[str]
+        key of the segment of each file, the name of the file without its extension if None
+    col_segment: str
+        col of the key of the segment
+    kwargs:
+        arguments of load_surveys, the same for all the files (with_survey_table is not supported)
+    Returns
+    -------
+    Return the DataFrame of all the surveys of all the segments, in the order of the files, with a new index.
+    The same survey id may appear in several segments, see interface_mj.apply_mj_segments.
     """
-    normalize file
+    if kwargs.get("with_survey_table"):
+        raise ValueError("with_survey_table is not supported by load_segmented_surveys")
+    segments = [Path(csv_file).stem for csv_file in csv_files] if segments is None else segments
+    if len(segments) != len(csv_files):
+        raise ValueError(f"{len(segments)} segments are given for {len(csv_files)} files")
+    if len(set(segments)) != len(segments):
+        raise ValueError(f"the segments {segments} are not unique")
+
+    dfs = []
+    for segment, csv_file in zip(segments, csv_files):
+        df = load_surveys(csv_file, **kwargs)
+        df.insert(0, col_segment, segment)
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def rolling_surveys(
+    df: DataFrame,
+    no_opinion_mode: bool = True,
+    window: str = "14d",
+    center: bool = True,
+    kernel: str = "flat",
+    weighted: bool = False,
+):
+    """
+    Rolling mean and std of the intentions of each candidate, all candidates and cols at once
 
     Parameters
     ----------
@@ -256,59 +542,43 @@ def rolling_surveys(df: DataFrame, no_opinion_mode: bool = True):
         dataframe of the survey
     no_opinion_mode: bool
         if we removed undecided votes
+    window: str
+        length of the rolling window
+    center: bool
+        if the window is centred on each date, else it ends on each date
+    kernel: str
+        weights of the days of the window, flat, triangular or exponential (see libs.smoothing.kernel_weights)
+    weighted: bool
+        if the surveys are weighted by their sample size (echantillon), else each date has the same weight
     Returns
     -------
     Return the DataFrame df with extra columns which store the rolling mean and std data
     """
-    surveys = get_list_survey(df)
     # verify if the number of grade is the same for each survey
-    nb_grades = []
-    for s in surveys:
-        # only the chosen survey
-        df_survey = df[df["id"] == s].copy()
-        nb_grades.append(df_survey["nombre_mentions"].unique()[0])
-        if len(list(set(nb_grades))) != 1:
-            raise RuntimeError(
-                "The number of grade should be the same for all surveys. Please aggregate grades"
-                "or use data from the same kind of polls"
-            )
+    if df.groupby("id", observed=True)["nombre_mentions"].first().nunique() > 1:
+        raise RuntimeError(
+            "The number of grade should be the same for all surveys. Please aggregate grades"
+            "or use data from the same kind of polls"
+        )
     # new cols to store the data (rolling mean, std)
     intentions_col = get_intentions_colheaders(df)
     intentions_col_std = [f"{col}_std" for col in intentions_col]
     intentions_col_roll = [f"{col}_roll" for col in intentions_col]
-    sans_opinion_roll = "sans_opinion_roll" if no_opinion_mode else None
-    df[intentions_col_std] = None
-    df[intentions_col_roll] = None
-    df[sans_opinion_roll] = np.nan
+    cols = intentions_col + ["sans_opinion"] if no_opinion_mode else intentions_col
     df = df.sort_values(by="fin_enquete")
-    # mean by candidates
-    for c in df["candidat"].unique():
-        df_temp = df[df["candidat"] == c]
-        df_temp.index = pd.to_datetime(df_temp["fin_enquete"])
-        df_temp = df_temp.sort_index()
-        # Resample("1d").mean() helps to handle multiple surveys on the same dates
-        df_temp[intentions_col_roll] = (
-            df_temp[intentions_col].resample("1d").mean().rolling("14d", min_periods=1, center=True).mean()
-        )
-        df_temp[intentions_col_std] = (
-            df_temp[intentions_col].resample("1d").mean().rolling("14d", min_periods=1, center=True).std()
-        )  # todo: std should be handled with with mean() over the same dates
-        # (std is underestimated if we have to values for the same date)
-        if no_opinion_mode:
-            df_temp[sans_opinion_roll] = (
-                df_temp["sans_opinion"].resample("1d").mean().rolling("14d", min_periods=1, center=True).mean()
-            )
-
-        if not df_temp[(df_temp[intentions_col_roll].sum(axis=1) - 100).round(3) != 0].empty:
-            raise RuntimeError("Rolling mean conducted to less than 100 sum of intentions of vote")
-
-        # refilling the original dataframe
-        df_temp.index = df[df["candidat"] == c].index
-        row_indexer = df[df["candidat"] == c].index
-        for col, col_std in zip(intentions_col_roll, intentions_col_std):
-            df.loc[row_indexer, col] = df_temp.loc[:, col]
-            df.loc[row_indexer, col_std] = df_temp.loc[:, col]
-        if no_opinion_mode:
-            df.loc[row_indexer, sans_opinion_roll] = df_temp.loc[:, sans_opinion_roll]
+
+    df_mean, df_std = smooth_surveys(
+        df, cols, "candidat", window, kernel, center, weights="echantillon" if weighted else None
+    )
+
+    # back to the rows of the surveys
+    rows = df_mean.index.get_indexer(pd.MultiIndex.from_arrays([df["candidat"], pd.to_datetime(df["fin_enquete"])]))
+    df[intentions_col_std] = df_std[intentions_col].to_numpy()[rows]
+    df[intentions_col_roll] = df_mean[intentions_col].to_numpy()[rows]
+    if no_opinion_mode:
+        df["sans_opinion_roll"] = df_mean["sans_opinion"].to_numpy()[rows]
+
+    if ((df[intentions_col_roll].sum(axis=1) - 100).round(3) != 0).any():
+        raise RuntimeError("Rolling mean conducted to less than 100 sum of intentions of vote")
 
     return df
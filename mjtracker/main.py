@@ -10,6 +10,8 @@ from batch_figure import (
     batch_comparison_intention,
 )
 from interface_mj import apply_mj
+from incremental_mj import apply_mj_incremental
+from libs.mj_cache import MajorityJudgmentCache
 from load_surveys import load_surveys
 from smp_data import SMPData
 from misc.enums import Candidacy, AggregationMode, PollingOrganizations, UntilRound
@@ -32,10 +34,15 @@ class Arguments(tap.Tap):
     json: bool = True
     csv: Path = Path("../presidentielle_jm.csv")
     dest: Path = Path("../trackerapp/data/graphs/")
+    incremental: bool = False  # only rank the surveys which changed since the last run
+    mj_store: Path = Path("../mj_store/")
+    mj_cache: Path = None  # folder to share the majority judgment results between runs and scripts
+    surveys_cache: Path = None  # folder to share the normalized surveys between runs and scripts
 
 
 def main(args: Arguments):
     args.dest.mkdir(exist_ok=True, parents=True)
+    cache = MajorityJudgmentCache(directory=args.mj_cache)
     aggregation = AggregationMode.NO_AGGREGATION
     df = load_surveys(
         args.csv,
@@ -45,11 +52,16 @@ def main(args: Arguments):
         polling_organization=PollingOrganizations.ALL,
         until_round=UntilRound.FIRST,
         rolling_data=False,
+        cache_dir=args.surveys_cache,
     )
 
     smp_data = SMPData()
     # apply mj on the whole dataframe for each survey
-    df = apply_mj(df, rolling_mj=False)
+    if args.incremental:
+        df, nb_ranked = apply_mj_incremental(df, args.mj_store / aggregation.value, rolling_mj=False, cache=cache)
+        print(f"ranked {nb_ranked} surveys out of {df['id'].nunique()}")
+    else:
+        df = apply_mj(df, rolling_mj=False, cache=cache)
     # generate merit profile figures
     batch_merit_profile(df, args)
     if not args.test:
@@ -73,13 +85,22 @@ def main(args: Arguments):
             polling_organization=PollingOrganizations.ALL,
             until_round=UntilRound.FIRST,
             rolling_data=True,
+            cache_dir=args.surveys_cache,
         )
-        df = apply_mj(df, rolling_mj=False)
-        df = apply_mj(df, rolling_mj=True)
+        if args.incremental:
+            for rolling_mj in (False, True):
+                df, nb_ranked = apply_mj_incremental(
+                    df, args.mj_store / aggregation.value, rolling_mj=rolling_mj, cache=cache
+                )
+                print(f"ranked {nb_ranked} surveys out of {df['id'].nunique()}")
+        else:
+            df = apply_mj(df, rolling_mj=False, cache=cache)
+            df = apply_mj(df, rolling_mj=True, cache=cache)
         batch_time_merit_profile_all(df, args, aggregation, on_rolling_data=False)
         batch_time_merit_profile_all(df, args, aggregation, on_rolling_data=True)
         batch_comparison_ranking(df, smp_data, args, on_rolling_data=True)
         batch_ranked_time_merit_profile(df, args, aggregation, on_rolling_data=True)
+    print(cache)
 
 
 if __name__ == "__main__":
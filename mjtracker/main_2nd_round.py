@@ -1,4 +1,6 @@
+from copy import copy
 from pathlib import Path
+from typing import List
 import tap
 from batch_figure import (
     batch_merit_profile,
@@ -9,8 +11,9 @@ from batch_figure import (
     batch_ranked_time_merit_profile,
     batch_comparison_intention,
 )
-from interface_mj import apply_mj
-from load_surveys import load_surveys
+from interface_mj import apply_mj_segments
+from libs.mj_cache import MajorityJudgmentCache
+from load_surveys import load_segmented_surveys
 from smp_data import SMPData
 from misc.enums import Candidacy, AggregationMode, PollingOrganizations, UntilRound
 
@@ -32,10 +35,19 @@ class Arguments(tap.Tap):
     json: bool = False
     csv: Path = Path("../presidentielle_jm.csv")
     dest: Path = Path("../trackerapp/data/graphs/")
+    mj_cache: Path = None  # folder to share the majority judgment results between runs and scripts
+    surveys_cache: Path = None  # folder to share the normalized surveys between runs and scripts
+    segments: List[Path] = [
+        Path("../presidentielle_2nd_tour_jm_lepen.csv"),
+        Path("../presidentielle_2nd_tour_jm_macron.csv"),
+        Path("../presidentielle_2nd_tour_jm_melenchonistes.csv"),
+        Path("../presidentielle_2nd_tour_jm_abstensionistes.csv"),
+    ]  # files of the surveys of each segment of voters, named by the last word of the file
 
 
 def main(args: Arguments):
     args.dest.mkdir(exist_ok=True, parents=True)
+    cache = MajorityJudgmentCache(directory=args.mj_cache)
     aggregation = AggregationMode.NO_AGGREGATION
     polls = PollingOrganizations.MIEUX_VOTER
     # df = load_surveys(
@@ -60,55 +72,27 @@ def main(args: Arguments):
     # batch_time_merit_profile(df, args, aggregation, polls=polls)
     # # # generate ranked time merit profile figures
     # batch_ranked_time_merit_profile(df, args, aggregation, polls=polls)
-    #
-    # polls = PollingOrganizations.MIEUX_VOTER
-    # df = load_surveys(
-    #     Path("../presidentielle_2nd_tour_jm_abstensionistes.csv"),
-    #     no_opinion_mode=True,
-    #     candidates=Candidacy.SECOND_ROUND,
-    #     aggregation=aggregation,
-    #     polling_organization=polls,
-    #     rolling_data=False,
-    # )
-    #
-    # df = apply_mj(df, rolling_mj=False)
-    # batch_ranked_time_merit_profile(df, args, aggregation, polls=polls)
-    #
-    # df = load_surveys(
-    #     Path("../presidentielle_2nd_tour_jm_melenchonistes.csv"),
-    #     no_opinion_mode=True,
-    #     candidates=Candidacy.SECOND_ROUND,
-    #     aggregation=aggregation,
-    #     polling_organization=polls,
-    #     rolling_data=False,
-    # )
-    #
-    # df = apply_mj(df, rolling_mj=False)
-    # batch_ranked_time_merit_profile(df, args, aggregation, polls=polls)
-
-    # df = load_surveys(
-    #     Path("../presidentielle_2nd_tour_jm_macron.csv"),
-    #     no_opinion_mode=True,
-    #     candidates=Candidacy.SECOND_ROUND,
-    #     aggregation=aggregation,
-    #     polling_organization=polls,
-    #     rolling_data=False,
-    # )
-    #
-    # df = apply_mj(df, rolling_mj=False)
-    # batch_ranked_time_merit_profile(df, args, aggregation, polls=polls)
 
-    df = load_surveys(
-        Path("../presidentielle_2nd_tour_jm_lepen.csv"),
+    # the surveys of each segment of voters, ranked all at once
+    df = load_segmented_surveys(
+        args.segments,
+        [csv.stem.split("_")[-1] for csv in args.segments],
         no_opinion_mode=True,
         candidates=Candidacy.SECOND_ROUND,
         aggregation=aggregation,
         polling_organization=polls,
         rolling_data=False,
+        cache_dir=args.surveys_cache,
     )
+    df = apply_mj_segments(df, rolling_mj=False, cache=cache)
+
+    for segment, df_segment in df.groupby("segment", sort=False):
+        # the figures of each segment are exported in its own subfolder of dest
+        segment_args = copy(args)
+        segment_args.dest = args.dest / segment
+        segment_args.dest.mkdir(exist_ok=True, parents=True)
+        batch_ranked_time_merit_profile(df_segment.copy(), segment_args, aggregation, polls=polls)
 
-    df = apply_mj(df, rolling_mj=False)
-    batch_ranked_time_merit_profile(df, args, aggregation, polls=polls)
 
 if __name__ == "__main__":
     args = Arguments().parse_args()
@@ -3,6 +3,7 @@ import tap
 from utils import get_list_survey, get_grades
 from plots import plot_merit_profiles, plot_animated_merit_profile
 from interface_mj import apply_mj
+from libs.mj_cache import MajorityJudgmentCache
 from load_surveys import load_surveys
 from misc.enums import Candidacy, AggregationMode, PollingOrganizations, UntilRound
 
@@ -20,6 +21,8 @@ class Arguments(tap.Tap):
     json: bool = True
     csv: Path = Path("../presidentielle_jm.csv")
     dest: Path = Path("../trackerapp/data/graphs/")
+    mj_cache: Path = None  # folder to share the majority judgment results between runs and scripts
+    surveys_cache: Path = None  # folder to share the normalized surveys between runs and scripts
 
 
 def main(args: Arguments):
@@ -33,10 +36,11 @@ def main(args: Arguments):
         polling_organization=PollingOrganizations.ALL,
         until_round=UntilRound.FIRST,
         rolling_data=False,
+        cache_dir=args.surveys_cache,
     )
 
     # apply mj on the whole dataframe for each survey
-    df = apply_mj(df, rolling_mj=False)
+    df = apply_mj(df, rolling_mj=False, cache=MajorityJudgmentCache(directory=args.mj_cache))
     # generate merit profile figures
 
     surveys = get_list_survey(df)
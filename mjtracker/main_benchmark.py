@@ -0,0 +1,53 @@
+from pathlib import Path
+from typing import List
+import importlib.util
+import tap
+import pandas as pd
+from libs.backends import benchmark_backends, BACKENDS
+
+
+class Arguments(tap.Tap):
+    backends: List[str] = None  # all the registered backends by default, official only if its lib is installed
+    reference: str = "batch"
+    nb_surveys: int = 100
+    nb_candidates: List[int] = [4, 12]
+    nb_grades: List[int] = [4, 7]
+    nb_voters: List[int] = [1000, 100_000]
+    repeat: int = 3
+    seed: int = 0
+    csv: Path = None  # where to save the results
+
+
+def main(args: Arguments):
+    backends = args.backends
+    if backends is None:
+        official_lib = importlib.util.find_spec("majority_judgment") is not None
+        backends = [name for name in BACKENDS if official_lib or name != "official"]
+    print(f"backends: {backends}")
+    df = benchmark_backends(
+        backends=backends,
+        nb_surveys=args.nb_surveys,
+        nb_candidates=args.nb_candidates,
+        nb_grades=args.nb_grades,
+        nb_voters=args.nb_voters,
+        reference=args.reference,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(df)
+    # fastest backend agreeing with the reference on each workload
+    df_correct = df[df["agreement"] == 1]
+    fastest = df_correct.loc[
+        df_correct.groupby(["nb_candidates", "nb_grades", "nb_voters"])["time_per_survey_ms"].idxmin()
+    ]
+    print(fastest)
+    if args.csv is not None:
+        df.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    args = Arguments().parse_args()
+    print(args)
+
+    main(args)
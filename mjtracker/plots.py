@@ -6,7 +6,7 @@ import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from mjtracker.smp_data import SMPData
-from mjtracker.utils import get_intentions_colheaders, get_candidates, get_grades, rank2str
+from mjtracker.utils import get_intentions_colheaders, get_candidates, get_grades, get_survey_table, rank2str
 from mjtracker.misc.enums import PollingOrganizations, AggregationMode
 
 
@@ -453,6 +453,7 @@ def ranking_plot(
     fig: go.Figure = None,
     row=None,
     col=None,
+    df_surveys: DataFrame = None,
 ) -> go.Figure:
     if on_rolling_data:
         if "rang_glissant" not in df.columns:
@@ -468,7 +469,7 @@ def ranking_plot(
 
     # Grade area
     if show_grade_area:
-        grades = get_grades(df)
+        grades = get_grades(df, df_surveys=df_surveys)
         nb_grades = len(grades)
         c_rgb = color_palette(palette="coolwarm", n_colors=nb_grades)
         for g, c in zip(grades, c_rgb):
@@ -684,6 +685,7 @@ def plot_comparison_intention(
     source: str = None,
     sponsor: str = None,
     on_rolling_data: bool = False,
+    df_surveys: DataFrame = None,
 ) -> go.Figure:
     """
     Plot the intention of the candidates in the two voting systems.
@@ -701,6 +703,8 @@ def plot_comparison_intention(
         Sponsor of the data survey.
     on_rolling_data : bool, optional
         If True, the data is on rolling data.
+    df_surveys : DataFrame, optional
+        Table of the surveys (see utils.get_survey_table) to look up their grades.
     ----------
     Returns
     -------
@@ -733,6 +737,7 @@ def plot_comparison_intention(
         col=2,
         on_rolling_data=on_rolling_data,
         show_logo=False,
+        df_surveys=df_surveys,
     )
     fig.add_trace(
         go.Scatter(
@@ -934,20 +939,21 @@ def plot_time_merit_profile(
     no_layout: bool = False,
     row: int = None,
     col: int = None,
+    df_surveys: DataFrame = None,
 ) -> go.Figure:
     if fig is None:
         fig = go.Figure()
 
     suffix = "_roll" if on_rolling_data else ""
 
-    nb_grades = len(get_grades(df))
+    grade_list = get_grades(df, df_surveys=df_surveys)
+    nb_grades = len(grade_list)
     colors = color_palette(palette="coolwarm", n_colors=nb_grades)
     col_intentions = [f"intention_mention_{i}{suffix}" for i in range(1, nb_grades + 1)]
     color_dict = {col: f"rgb{str(colors[i])}" for i, col in enumerate(col_intentions)}
 
     y_cumsum = df[col_intentions].to_numpy()
 
-    grade_list = get_grades(df)
     grade_list.reverse()
     col_intentions.reverse()
     y_cumsum = np.flip(y_cumsum.T, axis=0)
@@ -1023,7 +1029,9 @@ def plot_ranked_time_merit_profile(
     source: str = None,
     show_no_opinion: bool = True,
     on_rolling_data: bool = False,
+    df_surveys: DataFrame = None,
 ) -> go.Figure:
+    df_surveys = get_survey_table(df) if df_surveys is None else df_surveys
     # Candidat list sorted the rank in the last poll
     most_recent_date = df["fin_enquete"].max()
     temp_df = df[df["fin_enquete"] == most_recent_date]
@@ -1052,6 +1060,7 @@ def plot_ranked_time_merit_profile(
         fig = plot_time_merit_profile(
             df=temp_df,
             fig=fig,
+            df_surveys=df_surveys,
             on_rolling_data=on_rolling_data,
             show_no_opinion=show_no_opinion,
             show_legend=show_legend,
@@ -1092,7 +1101,10 @@ def plot_ranked_time_merit_profile(
     return fig
 
 
-def plot_time_merit_profile_all_polls(df, aggregation, on_rolling_data: bool = False) -> go.Figure:
+def plot_time_merit_profile_all_polls(
+    df, aggregation, on_rolling_data: bool = False, df_surveys: DataFrame = None
+) -> go.Figure:
+    df_surveys = get_survey_table(df) if df_surveys is None else df_surveys
     name_subplot = tuple([poll.value for poll in PollingOrganizations if poll != PollingOrganizations.ALL])
     suffix = "_roll" if on_rolling_data else ""
     fig = make_subplots(rows=3, cols=1, subplot_titles=name_subplot)
@@ -1114,13 +1126,14 @@ def plot_time_merit_profile_all_polls(df, aggregation, on_rolling_data: bool = F
         df_poll = df[df["nom_institut"] == poll.value].copy() if poll != PollingOrganizations.ALL else df.copy()
         if df_poll.empty:
             continue
-        nb_grades = len(get_grades(df_poll))
+        grades = get_grades(df_poll, df_surveys=df_surveys)
+        nb_grades = len(grades)
         colors = color_palette(palette="coolwarm", n_colors=nb_grades)
         color_dict = {f"intention_mention_{i + 1}": f"rgb{str(colors[i])}" for i in range(nb_grades)}
 
         col_intention = get_intentions_colheaders(df_poll, nb_grades)
         y_cumsum = df_poll[col_intention].to_numpy()
-        for g, col, cur_y in zip(get_grades(df_poll), col_intention, y_cumsum.T):
+        for g, col, cur_y in zip(grades, col_intention, y_cumsum.T):
             fig.add_trace(
                 go.Scatter(
                     x=df_poll["fin_enquete"],
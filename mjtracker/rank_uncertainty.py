@@ -0,0 +1,202 @@
+"""
+Uncertainty of the majority judgment ranks of each survey.
+
+With samples of about 1000 respondents, two candidates are often ranked within the noise of the survey.
+The merit profiles of all the surveys are resampled thousands of times at once (multinomial resampling of the
+respondents, or Dirichlet posterior of the proportions), and each resample is ranked with the vectorized majority
+judgment, which gives the probability of each rank and the confidence in the median grade of each candidate.
+"""
+from multiprocessing import Pool
+
+import numpy as np
+from pandas import DataFrame
+
+from .libs import majority_judgment_batch as batch_mj
+from .libs.majority_judgment_2 import to_tallies
+from .libs.merit_profiles import MeritProfiles
+
+
+def resample_profiles(
+    tallies: np.ndarray, grade_mask: np.ndarray, nb_samples: int, rng: np.random.Generator, method: str = "multinomial"
+) -> np.ndarray:
+    """
+    Draw resamples of the merit profiles of all the surveys at once
+
+    Parameters
+    ----------
+    tallies: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) number of votes of each grade
+    grade_mask: np.ndarray
+        (nb_surveys, nb_grades) True for the grades available in each survey
+    nb_samples: int
+        number of resamples
+    rng: np.random.Generator
+        random generator
+    method: str
+        "multinomial" to resample the respondents, "dirichlet" to draw the proportions from their posterior
+        with a uniform prior on the grades of the survey
+    Returns
+    -------
+    (nb_samples, nb_surveys, nb_candidates, nb_grades) resampled merit profiles
+    """
+    sample_sizes = tallies.sum(axis=-1)
+    size = (nb_samples,) + sample_sizes.shape
+    if method == "multinomial":
+        proportions = np.divide(
+            tallies, sample_sizes[..., None], out=np.zeros(tallies.shape), where=sample_sizes[..., None] > 0
+        )
+        return rng.multinomial(sample_sizes, proportions, size=size)
+    if method == "dirichlet":
+        alpha = np.where(grade_mask[:, None, :], tallies + 1.0, 0.0)
+        gammas = rng.standard_gamma(alpha, size=size + tallies.shape[-1:])
+        totals = gammas.sum(axis=-1, keepdims=True)
+        return np.divide(gammas, totals, out=np.zeros(gammas.shape), where=totals > 0)
+    raise ValueError(f"Unknown resampling method {method}, use multinomial or dirichlet")
+
+
+def _resample_ranks(args: tuple):
+    """
+    Rank a chunk of resamples and count the ranks and the median grades of each candidate
+    """
+    tallies, grade_mask, candidate_mask, median_grades, nb_samples, seed, method = args
+    rng = np.random.default_rng(seed)
+    profiles = resample_profiles(tallies, grade_mask, nb_samples, rng, method)
+
+    nb_surveys, nb_candidates, nb_grades = tallies.shape
+    ranks, medians = batch_mj.majority_judgment(
+        profiles.reshape(-1, nb_candidates, nb_grades), np.tile(candidate_mask, (nb_samples, 1))
+    )
+    ranks = ranks.reshape(nb_samples, nb_surveys, nb_candidates)
+    medians = medians.reshape(nb_samples, nb_surveys, nb_candidates)
+
+    cells = np.arange(nb_surveys * nb_candidates).reshape(nb_surveys, nb_candidates)
+    rank_counts = np.bincount(
+        (cells[None] * nb_candidates + ranks - 1).ravel(), minlength=nb_surveys * nb_candidates * nb_candidates
+    ).reshape(nb_surveys, nb_candidates, nb_candidates)
+    median_counts = (medians == median_grades[None]).sum(axis=0)
+    return rank_counts, median_counts
+
+
+def rank_distributions(
+    tallies: np.ndarray,
+    grade_mask: np.ndarray,
+    candidate_mask: np.ndarray,
+    nb_samples: int = 1000,
+    method: str = "multinomial",
+    seed: int = 0,
+    chunk_size: int = 100,
+    nb_workers: int = None,
+):
+    """
+    Probability of each rank and of the median grade of each candidate of each survey
+
+    Parameters
+    ----------
+    tallies: np.ndarray
+        (nb_surveys, nb_candidates, nb_grades) number of votes of each grade, from the worst to the best grade
+    grade_mask: np.ndarray
+        (nb_surveys, nb_grades) True for the grades available in each survey
+    candidate_mask: np.ndarray
+        (nb_surveys, nb_candidates) True for the candidates available in each survey
+    nb_samples: int
+        number of resamples
+    method: str
+        "multinomial" or "dirichlet", see resample_profiles
+    seed: int
+        seed of the random generator, the results do not depend on nb_workers
+    chunk_size: int
+        number of resamples drawn at once, to cap the memory
+    nb_workers: int
+        number of worker processes ranking the chunks of resamples, in the current process if None
+    Returns
+    -------
+        rank_probabilities (nb_surveys, nb_candidates, nb_candidates) probability of each rank, starting from 1
+        median_confidence (nb_surveys, nb_candidates) probability to get the median grade of the survey
+    """
+    _, median_grades = batch_mj.majority_judgment(tallies, candidate_mask)
+    chunks = [min(chunk_size, nb_samples - i) for i in range(0, nb_samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(tallies, grade_mask, candidate_mask, median_grades, n, s, method) for n, s in zip(chunks, seeds)]
+
+    if nb_workers is None:
+        results = map(_resample_ranks, tasks)
+    else:
+        with Pool(nb_workers) as pool:
+            results = pool.map(_resample_ranks, tasks)
+
+    rank_counts = np.zeros(candidate_mask.shape + candidate_mask.shape[-1:], dtype=np.int64)
+    median_counts = np.zeros(candidate_mask.shape, dtype=np.int64)
+    for chunk_rank_counts, chunk_median_counts in results:
+        rank_counts += chunk_rank_counts
+        median_counts += chunk_median_counts
+
+    return rank_counts / nb_samples, median_counts / nb_samples
+
+
+def apply_rank_uncertainty(
+    df: DataFrame,
+    rolling_mj: bool = False,
+    nb_samples: int = 1000,
+    method: str = "multinomial",
+    seed: int = 0,
+    chunk_size: int = 100,
+    nb_workers: int = None,
+    reversed: bool = True,
+    interval: float = 0.95,
+):
+    """
+    Add the uncertainty of the majority judgment ranks to the DataFrame returned by apply_mj
+
+    Parameters
+    ----------
+    df: DataFrame
+        contains all the data of vote / survey
+    rolling_mj: bool
+        if we consider the rolling majority judgment
+    nb_samples: int
+        number of resamples of each survey
+    method: str
+        "multinomial" or "dirichlet", see resample_profiles
+    seed: int
+        seed of the random generator
+    chunk_size: int
+        number of resamples drawn at once, to cap the memory
+    nb_workers: int
+        number of worker processes, in the current process if None
+    reversed: bool
+        if the intentions are given from the best grade to the worst grade
+    interval: float
+        probability of the interval of ranks
+    Returns
+    -------
+    Return the DataFrame df with the extra columns
+        proba_rang: probability of each rank, starting from 1
+        rang_inf, rang_sup: interval of ranks
+        confiance_mention: probability of the median grade of the survey
+    (with the suffix _glissant for rolling majority judgment)
+    """
+    suffix = "_roll" if rolling_mj else ""
+    col_suffix = "_glissant" if rolling_mj else ""
+    col_intentions = [f"intention_mention_{i}{suffix}" for i in range(1, 8)]
+
+    merit_profiles, survey_idx, candidate_idx = MeritProfiles.from_dataframe(
+        df, col_intentions, reverse=reversed, col_sample_size="echantillon"
+    )
+    grade_mask, candidate_mask = merit_profiles.grade_mask, merit_profiles.candidate_mask
+    tallies = to_tallies(
+        merit_profiles.profiles, np.broadcast_to(merit_profiles.sample_sizes[:, None], candidate_mask.shape)
+    )
+
+    rank_probabilities, median_confidence = rank_distributions(
+        tallies, grade_mask, candidate_mask, nb_samples, method, seed, chunk_size, nb_workers
+    )
+
+    nb_candidates = candidate_mask.sum(axis=1)[survey_idx]
+    row_probabilities = rank_probabilities[survey_idx, candidate_idx]
+    cdf = np.cumsum(row_probabilities, axis=1)
+    df[f"proba_rang{col_suffix}"] = [p[:n] for p, n in zip(row_probabilities, nb_candidates)]
+    df[f"rang_inf{col_suffix}"] = np.argmax(cdf >= (1 - interval) / 2, axis=1) + 1
+    df[f"rang_sup{col_suffix}"] = np.argmax(cdf >= 1 - (1 - interval) / 2 - 1e-12, axis=1) + 1
+    df[f"confiance_mention{col_suffix}"] = median_confidence[survey_idx, candidate_idx]
+
+    return df
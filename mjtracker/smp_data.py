@@ -3,6 +3,8 @@ import pandas as pd
 import datetime
 import warnings
 
+from libs.smoothing import smooth_surveys
+
 
 class SMPData:
     """
@@ -16,6 +18,11 @@ class SMPData:
         The raw data from the csv file.
     df_treated : pd.DataFrame
         The dataframe with the data treated (moving average, etc.).
+    window : str
+        The length of the moving average with a kernel.
+    kernel : str
+        The weights of the days of the moving average, flat, triangular or exponential (see libs.smoothing),
+        None for the historical moving average of the published curves (see _historical_rolling).
 
     Methods
     -------
@@ -27,7 +34,7 @@ class SMPData:
         Load the uninomial intentions into a nice dataframe.
     """
 
-    def __init__(self, source_file: str = None):
+    def __init__(self, source_file: str = None, window: str = "14d", kernel: str = None):
         self.source = (
             "https://raw.githubusercontent.com/nsppolls/nsppolls/master/presidentielle.csv"
             if source_file is None
@@ -36,6 +43,8 @@ class SMPData:
         print("using panda source " + self.source)
         self.df_raw = pd.read_csv(self.source)
         self.df_treated = None
+        self.window = window
+        self.kernel = kernel
         self._treatement()
 
     def _treatement(self):
@@ -65,25 +74,27 @@ class SMPData:
             "Nicolas Dupont-Aignan": {"couleur": "#3a84c4"},
         }
 
+        if self.kernel is not None:
+            # moving average of all the candidates at once, centred on each day with surveys
+            df_rolling, df_rolling_std = smooth_surveys(
+                df[df["candidat"].isin(list(CANDIDATS))],
+                ["intentions", "erreur_inf", "erreur_sup"],
+                window=self.window,
+                kernel=self.kernel,
+            )
+            df_rolling, df_rolling_std = round(df_rolling, 2), round(df_rolling_std, 2)
+
         dict_candidats = {}
         derniere_intention = pd.DataFrame()  # columns=["candidat", "intentions"])
         for candidat in CANDIDATS:
             df_temp = df[df["candidat"] == candidat]
             df_temp.index = pd.to_datetime(df_temp["fin_enquete"])
 
-            df_temp_rolling = (
-                df_temp[["intentions", "erreur_inf", "erreur_sup"]]
-                .rolling("10d", min_periods=1)
-                .mean()
-                .shift(-5)
-                .dropna()
-            )
-            df_temp_rolling_std = df_temp[["intentions"]].rolling("10d", min_periods=1).std().shift(-5).dropna()
-
-            df_temp_rolling = round(df_temp_rolling.resample("1d").mean().dropna(), 2).rolling(window=7).mean().dropna()
-            df_temp_rolling_std = (
-                round(df_temp_rolling_std.resample("1d").mean().dropna(), 2).rolling(window=7).mean().dropna()
-            )
+            if self.kernel is None:
+                df_temp_rolling, df_temp_rolling_std = self._historical_rolling(df_temp)
+            else:
+                df_temp_rolling = df_rolling.loc[candidat]
+                df_temp_rolling_std = df_rolling_std.loc[candidat]
 
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
@@ -118,6 +129,33 @@ class SMPData:
 
         self.df_treated = pd.read_json("intentionsCandidatsMoyenneMobile14Jours.json")
 
+    @staticmethod
+    def _historical_rolling(df_temp: pd.DataFrame):
+        """
+        Moving average of the published curves: mean of the surveys of the last 10 days, shifted by 5 surveys,
+        then mean of 7 days with surveys.
+
+        Parameters
+        ----------
+        df_temp : pd.DataFrame
+            The surveys of a candidate, indexed by their end date.
+
+        Returns
+        -------
+        df_temp_rolling, df_temp_rolling_std : pd.DataFrame
+            The moving average of the intentions and their errors, and the moving std of the intentions.
+        """
+        df_temp_rolling = (
+            df_temp[["intentions", "erreur_inf", "erreur_sup"]].rolling("10d", min_periods=1).mean().shift(-5).dropna()
+        )
+        df_temp_rolling_std = df_temp[["intentions"]].rolling("10d", min_periods=1).std().shift(-5).dropna()
+
+        df_temp_rolling = round(df_temp_rolling.resample("1d").mean().dropna(), 2).rolling(window=7).mean().dropna()
+        df_temp_rolling_std = (
+            round(df_temp_rolling_std.resample("1d").mean().dropna(), 2).rolling(window=7).mean().dropna()
+        )
+        return df_temp_rolling, df_temp_rolling_std
+
     def get_ranks(self):
         """
         Load the ranks of the candidates.
@@ -0,0 +1,163 @@
+"""
+Streaming loader of large archives of surveys: the csv file is read by chunks of rows, each chunk is cut at the
+boundary of the last survey it contains, so that a survey never straddles two chunks, and normalized on its own
+with load_surveys.normalize_surveys. The peak memory is bounded by the size of a chunk instead of the whole archive.
+
+The rows of a survey must be contiguous in the file, which holds for the files of the tracker.
+The rolling intentions span several surveys and are not computed here, see load_surveys.rolling_surveys.
+"""
+from pathlib import Path
+from typing import Iterator, List
+import pandas as pd
+from pandas import DataFrame
+
+from load_surveys import normalize_surveys
+from misc.enums import Candidacy, AggregationMode, PollingOrganizations
+
+
+def iter_survey_chunks(
+    csv_file: Path,
+    chunk_size: int = 10_000,
+    no_opinion_mode: bool = True,
+    candidates: Candidacy = None,
+    aggregation: AggregationMode = None,
+    polling_organization: PollingOrganizations = None,
+    start_date: str = None,
+    end_date: str = None,
+    candidate_names: List[str] = None,
+    standardisation_file: Path = Path("../standardisation.csv"),
+) -> Iterator[DataFrame]:
+    """
+    Read and normalize the surveys of a csv file by chunks of whole surveys
+
+    Parameters
+    ----------
+    csv_file: Path
+        Path of the  file which contains all the data of vote / survey
+    chunk_size: int
+        number of rows read at once, a chunk holds a bit more rows to end with a whole survey
+    no_opinion_mode: bool
+        remove or not the undecided grades
+    candidates: Candidacy
+        how to manage candidacies
+    aggregation: AggregationMode
+        how to manage Aggregation of several grades
+    polling_organization: PollingOrganizations
+        select polling organization
+    start_date: str
+        keep the surveys ending from this date (included)
+    end_date: str
+        keep the surveys ending before this date (excluded)
+    candidate_names: List[str]
+        keep only these candidates
+    standardisation_file: Path
+        Path of the table of standardisation of the grades
+    Returns
+    -------
+    Iterator over the DataFrames of the normalized chunks, empty chunks are skipped
+    """
+    if candidates is None:
+        candidates = Candidacy.ALL
+    if aggregation is None:
+        aggregation = AggregationMode.NO_AGGREGATION
+    if polling_organization is None:
+        polling_organization = PollingOrganizations.ALL
+    df_standardisation = pd.read_csv(standardisation_file, na_filter=False)
+
+    def normalize(df_chunk: DataFrame) -> DataFrame:
+        return normalize_surveys(
+            df_chunk,
+            df_standardisation,
+            no_opinion_mode,
+            candidates,
+            aggregation,
+            polling_organization,
+            start_date,
+            end_date,
+            candidate_names,
+        )
+
+    # rows of the last survey of the previous chunk, which may continue in the next chunk
+    df_remainder = None
+    with pd.read_csv(csv_file, na_filter=False, chunksize=chunk_size) as reader:
+        for df_chunk in reader:
+            if df_remainder is not None:
+                df_chunk = pd.concat([df_remainder, df_chunk])
+            ids = df_chunk["id"].to_numpy()
+            is_last_survey = ids == ids[-1]
+            df_remainder = df_chunk[is_last_survey]
+            df_chunk = normalize(df_chunk[~is_last_survey].copy())
+            if len(df_chunk):
+                yield df_chunk
+
+    if df_remainder is not None:
+        df_chunk = normalize(df_remainder.copy())
+        if len(df_chunk):
+            yield df_chunk
+
+
+def iter_surveys(csv_file: Path, chunk_size: int = 10_000, **kwargs) -> Iterator[DataFrame]:
+    """
+    Read and normalize the surveys of a csv file one by one, ex: to rank them with interface_mj.apply_mj
+
+    Parameters
+    ----------
+    csv_file: Path
+        Path of the  file which contains all the data of vote / survey
+    chunk_size: int
+        number of rows read at once
+    kwargs:
+        selection and normalization of the surveys, see iter_survey_chunks
+    Returns
+    -------
+    Iterator over the DataFrames of each survey
+    """
+    for df_chunk in iter_survey_chunks(csv_file, chunk_size, **kwargs):
+        for _, df_survey in df_chunk.groupby("id", sort=False, observed=True):
+            yield df_survey
+
+
+def write_survey_store(csv_file: Path, store: Path, chunk_size: int = 10_000, **kwargs) -> List[Path]:
+    """
+    Normalize the surveys of a csv file by chunks and write each chunk in a part of a store
+
+    Parameters
+    ----------
+    csv_file: Path
+        Path of the  file which contains all the data of vote / survey
+    store: Path
+        folder of the parts, the parts of a previous store are removed
+    chunk_size: int
+        number of rows read at once
+    kwargs:
+        selection and normalization of the surveys, see iter_survey_chunks
+    Returns
+    -------
+    The paths of the parts, in the order of the csv file
+    """
+    store = Path(store)
+    store.mkdir(exist_ok=True, parents=True)
+    for part in store.glob("part_*.pkl"):
+        part.unlink()
+
+    parts = []
+    for i, df_chunk in enumerate(iter_survey_chunks(csv_file, chunk_size, **kwargs)):
+        # pickles keep the dtypes of the mixed string and numeric cols of the surveys, as the cache of load_surveys
+        parts.append(store / f"part_{i:05d}.pkl")
+        df_chunk.to_pickle(parts[-1])
+    return parts
+
+
+def iter_survey_store(store: Path) -> Iterator[DataFrame]:
+    """
+    Read the parts of a store written by write_survey_store one at a time
+    """
+    for part in sorted(Path(store).glob("part_*.pkl")):
+        yield pd.read_pickle(part)
+
+
+def read_survey_store(store: Path) -> DataFrame:
+    """
+    Read all the parts of a store written by write_survey_store in a single DataFrame
+    """
+    return pd.concat(iter_survey_store(store))
@@ -1,5 +1,18 @@
+import pandas as pd
 from pandas import DataFrame
 
+# fields of the surveys, the same on every row of a survey
+SURVEY_COLS = [
+    "nom_institut",
+    "commanditaire",
+    "debut_enquete",
+    "fin_enquete",
+    "echantillon",
+    "population",
+    "hypothese",
+    "nombre_mentions",
+] + [f"mention_{i}" for i in range(1, 8)]
+
 
 def get_list_survey(df: DataFrame):
     """
@@ -54,7 +67,47 @@ def get_intentions_colheaders(df: DataFrame, nb_mentions: int = 7):
     return intentions_colheader[:nb_mentions]
 
 
-def get_grades(df: DataFrame, nb_mentions: int = 7) -> list:
+def get_survey_table(df: DataFrame) -> DataFrame:
+    """
+    Get the table of the surveys, one row per survey indexed by id, with the tuple of its grades in the col mentions
+
+    Parameters
+    ----------
+    df : DataFrame
+        DataFrame containing the surveys, one row per candidate
+    Returns
+    -------
+        DataFrame of the fields of the surveys
+    """
+    cols = [c for c in SURVEY_COLS if c in df.columns]
+    df_surveys = df.drop_duplicates("id").set_index("id")[cols].copy()
+    labels = df_surveys[[f"mention_{i}" for i in range(1, 8)]].to_numpy()
+    available = pd.notna(labels) & (labels != "nan")
+    df_surveys["mentions"] = [tuple(label[a]) for label, a in zip(labels, available)]
+    return df_surveys
+
+
+def join_survey_table(df: DataFrame, df_surveys: DataFrame, cols: list = None) -> DataFrame:
+    """
+    Join fields of the table of surveys to the rows of the candidates
+
+    Parameters
+    ----------
+    df : DataFrame
+        DataFrame of the candidates, with the id of their survey
+    df_surveys : DataFrame
+        table of the surveys, see get_survey_table
+    cols : list
+        fields to join, all the fields which are not already in df if None
+    Returns
+    -------
+        DataFrame df with the fields of the surveys
+    """
+    cols = [c for c in df_surveys.columns if c not in df.columns] if cols is None else cols
+    return df.join(df_surveys[cols], on="id")
+
+
+def get_grades(df: DataFrame, nb_mentions: int = 7, df_surveys: DataFrame = None) -> list:
     """
     Get the grades of the candidates
 
@@ -64,16 +117,18 @@ def get_grades(df: DataFrame, nb_mentions: int = 7) -> list:
        DataFrame containing the surveys
     nb_mentions : int
        Number of mentions
+    df_surveys : DataFrame
+       table of the surveys (see get_survey_table) to look up the grades of the survey of df
     Returns
     -------
        List of grades of the candidates
     """
-    list_col = df.columns.to_list()
-    mentions_colheader = [s for s in list_col if "mention" in s and not "intention" in s and not "nombre" in s]
-    mentions_colheader = mentions_colheader[:nb_mentions]
-    numpy_mention = df[mentions_colheader].to_numpy().tolist()[0]
+    if df_surveys is not None:
+        return list(df_surveys.at[df["id"].iloc[0], "mentions"][:nb_mentions])
+
+    numpy_mention = df[[f"mention_{i}" for i in range(1, nb_mentions + 1)]].to_numpy().tolist()[0]
 
-    numpy_mention = [m for m in numpy_mention if m != "nan"]
+    numpy_mention = [m for m in numpy_mention if m != "nan" and not pd.isna(m)]
     return numpy_mention
 
 